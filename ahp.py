@@ -10,15 +10,19 @@ def calculate_weights(matrix):
     weights = np.mean(normalized_matrix, axis=1)
     return weights / np.sum(weights)  # Ensure weights sum to 1
 
+# Ma trận được coi là nhất quán khi CR < CONSISTENCY_THRESHOLD
+CONSISTENCY_THRESHOLD = 0.1
+
+# Random consistency index values; for n > 15 the last known value is used
+RANDOM_INDEX = {1: 0, 2: 0, 3: 0.58, 4: 0.9, 5: 1.12, 6: 1.24, 7: 1.32, 8: 1.41, 9: 1.45, 10: 1.49, 11: 1.51, 12: 1.54, 13: 1.56, 14: 1.57, 15: 1.59}
+
+def _random_index(n):
+    return RANDOM_INDEX[min(n, 15)]
+
 def calculate_consistency_ratio(matrix, weights):
     """Calculate consistency ratio to check if comparisons are consistent"""
     n = len(weights)
     
-    # Random consistency index values
-    RI = {1: 0, 2: 0, 3: 0.58, 4: 0.9, 5: 1.12, 6: 1.24, 7: 1.32, 8: 1.41, 9: 1.45, 10: 1.49, 11: 1.51, 12: 1.54, 13: 1.56, 14: 1.57, 15: 1.59}
-    # For n > 15, use the last known RI value
-
-    
     # Calculate lambda max
     weighted_sum = np.dot(matrix, weights)
     consistency_vector = weighted_sum / weights
@@ -28,11 +32,111 @@ def calculate_consistency_ratio(matrix, weights):
     CI = (lambda_max - n) / (n - 1) if n > 1 else 0
     
     # Calculate consistency ratio
-    CR = CI / RI[n] if n >= 1 and n <= 15 and n > 1 else (CI / RI[15] if n > 15 and n > 1 else 0)
+    CR = CI / _random_index(n) if n > 2 else 0
     
     # Return a tuple of (CR, Lambda_max, CI)
     return (CR, lambda_max, CI)
 
+def batch_consistency(matrices, worst=3):
+    """
+    Weights and consistency metrics of a stack of same-sized matrices in one pass.
+    
+    Args:
+        matrices: array of shape (k, n, n)
+        worst: number of most inconsistent upper-triangle cells to report per matrix
+    
+    Returns:
+        dict with weights (k, n), lambda_max, ci, cr (k,) and worst_cells, a
+        list per matrix of (i, j, value, suggested) ordered by how far
+        value is from the suggested w_i / w_j
+    """
+    matrices = np.asarray(matrices, dtype=np.float64)
+    k, n, _ = matrices.shape
+    normalized = matrices / matrices.sum(axis=1, keepdims=True)
+    weights = normalized.mean(axis=2)
+    weights = weights / weights.sum(axis=1, keepdims=True)
+    
+    weighted_sum = np.einsum('kij,kj->ki', matrices, weights)
+    lambda_max = (weighted_sum / weights).mean(axis=1)
+    ci = (lambda_max - n) / (n - 1) if n > 1 else np.zeros(k)
+    cr = ci / _random_index(n) if n > 2 else np.zeros(k)
+    
+    # Sai lệch của từng ô so với ma trận nhất quán tạo bởi trọng số: |log(a_ij * w_j / w_i)|
+    rows, cols = np.triu_indices(n, k=1)
+    suggested = weights[:, rows] / weights[:, cols]
+    values = matrices[:, rows, cols]
+    deviation = np.abs(np.log(values / suggested))
+    top = np.argsort(-deviation, axis=1)[:, :worst]
+    worst_cells = [
+        [(int(rows[c]), int(cols[c]), float(values[m, c]), float(suggested[m, c])) for c in top[m]]
+        for m in range(k)
+    ]
+    return {
+        'weights': weights,
+        'lambda_max': lambda_max,
+        'ci': ci,
+        'cr': cr,
+        'worst_cells': worst_cells,
+    }
+
+def upper_triangle_view(matrix):
+    """Copy of a pairwise matrix with 1 on the diagonal and 0 below it, for editing the upper triangle"""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    view = np.triu(matrix, k=1)
+    np.fill_diagonal(view, 1.0)
+    return view
+
+def complete_reciprocal(values, previous=None):
+    """
+    Build a reciprocal matrix from the upper triangle of values.
+
+    Upper-triangle cells that are blank (NaN), zero, negative or infinite are
+    invalid; they keep the value from previous (or 1 if there is none).
+
+    Args:
+        values: square array whose upper triangle holds the judgments
+        previous: matrix to take fallback values from
+
+    Returns:
+        tuple: (complete matrix, number of invalid cells replaced)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[0]
+    rows, cols = np.triu_indices(n, k=1)
+    upper = values[rows, cols]
+    invalid = ~np.isfinite(upper) | (upper <= 0)
+    if invalid.any():
+        fallback = (np.asarray(previous, dtype=np.float64)[rows, cols]
+                    if previous is not None else np.ones_like(upper))
+        upper = np.where(invalid, fallback, upper)
+    
+    matrix = np.ones((n, n))
+    matrix[rows, cols] = upper
+    matrix[cols, rows] = 1.0 / upper
+    return matrix, int(invalid.sum())
+
+def remap_matrix(matrix, old_labels, new_labels):
+    """
+    Carry the judgments of a pairwise matrix over to a new label list.
+
+    Rows and columns of labels present in both lists keep their values (in the
+    new order); rows and columns of added labels are 1, removed labels are dropped.
+
+    Args:
+        matrix: square matrix whose rows/columns follow old_labels
+        old_labels: labels of matrix
+        new_labels: labels of the returned matrix
+
+    Returns:
+        numpy.ndarray of shape (len(new_labels), len(new_labels))
+    """
+    position = {label: k for k, label in enumerate(old_labels)}
+    kept_new = [k for k, label in enumerate(new_labels) if label in position]
+    kept_old = [position[new_labels[k]] for k in kept_new]
+    remapped = np.ones((len(new_labels), len(new_labels)))
+    remapped[np.ix_(kept_new, kept_new)] = np.asarray(matrix, dtype=np.float64)[np.ix_(kept_old, kept_old)]
+    return remapped
+
 def get_saaty_scale_description(value, language="en"):
     """Return description for Saaty scale values in the selected language"""
     if language == "en":
@@ -63,35 +167,23 @@ def get_saaty_scale_description(value, language="en"):
 
 def calculate_all_results(criteria_matrix, alternative_matrices, criteria, alternatives):
     """Calculate all AHP results"""
-    # Calculate criteria weights
-    criteria_weights = calculate_weights(criteria_matrix)
+    # Criteria matrix, then every alternative matrix stacked into one batch
+    criteria_metrics = batch_consistency(np.asarray(criteria_matrix)[np.newaxis])
+    criteria_weights = criteria_metrics['weights'][0]
+    consistency_ratios = {'criteria': float(criteria_metrics['cr'][0])}
+    lambda_max_values = {'criteria': float(criteria_metrics['lambda_max'][0])}
+    consistency_indices = {'criteria': float(criteria_metrics['ci'][0])}
     
-    # Calculate consistency metrics for criteria
-    cr_criteria, lambda_max_criteria, ci_criteria = calculate_consistency_ratio(criteria_matrix, criteria_weights)
-    consistency_ratios = {'criteria': cr_criteria}
-    lambda_max_values = {'criteria': lambda_max_criteria}
-    consistency_indices = {'criteria': ci_criteria}
-    
-    # Calculate alternative weights for each criterion
+    alternative_metrics = batch_consistency(np.stack([alternative_matrices[c] for c in criteria]))
     alternative_weights = {}
     for criterion_idx, criterion in enumerate(criteria):
-        alt_weights = calculate_weights(alternative_matrices[criterion])
-        alternative_weights[criterion] = alt_weights
-        
-        # Calculate consistency metrics for alternatives
-        cr_alt, lambda_max_alt, ci_alt = calculate_consistency_ratio(alternative_matrices[criterion], alt_weights)
-        consistency_ratios[criterion] = cr_alt
-        lambda_max_values[criterion] = lambda_max_alt
-        consistency_indices[criterion] = ci_alt
-    
-    # Calculate final scores
-    n_alternatives = len(alternatives)
-    final_scores = np.zeros(n_alternatives)
+        alternative_weights[criterion] = alternative_metrics['weights'][criterion_idx]
+        consistency_ratios[criterion] = float(alternative_metrics['cr'][criterion_idx])
+        lambda_max_values[criterion] = float(alternative_metrics['lambda_max'][criterion_idx])
+        consistency_indices[criterion] = float(alternative_metrics['ci'][criterion_idx])
     
-    for i, criterion in enumerate(criteria):
-        criterion_weight = criteria_weights[i]
-        alt_weights = alternative_weights[criterion]
-        final_scores += criterion_weight * alt_weights
+    # Final scores: criteria weights applied to the stacked alternative weights
+    final_scores = criteria_weights @ alternative_metrics['weights']
     
     return {
         'criteria_weights': criteria_weights,
@@ -100,4 +192,4 @@ def calculate_all_results(criteria_matrix, alternative_matrices, criteria, alter
         'consistency_ratios': consistency_ratios,
         'lambda_max_values': lambda_max_values,
         'consistency_indices': consistency_indices
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,199 @@
+import numpy as np
+import db
+from ahp import CONSISTENCY_THRESHOLD
+
+# Ngưỡng nhất quán của AHP và số khoảng của biểu đồ phân bố trọng số
+CR_THRESHOLD = CONSISTENCY_THRESHOLD
+WEIGHT_BUCKETS = 10
+
+def create_tables(conn):
+    """Create the summary tables maintained by apply_session"""
+    db.execute(conn, '''
+    CREATE TABLE IF NOT EXISTS analytics_criterion_weights (
+        criterion TEXT PRIMARY KEY,
+        sessions INTEGER NOT NULL,
+        weight_sum REAL NOT NULL,
+        weight_sumsq REAL NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    db.execute(conn, '''
+    CREATE TABLE IF NOT EXISTS analytics_weight_buckets (
+        criterion TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        sessions INTEGER NOT NULL,
+        PRIMARY KEY (criterion, bucket)
+    ) WITHOUT ROWID
+    ''')
+    db.execute(conn, '''
+    CREATE TABLE IF NOT EXISTS analytics_consistency (
+        scope TEXT PRIMARY KEY,
+        matrices INTEGER NOT NULL,
+        cr_sum REAL NOT NULL,
+        cr_sumsq REAL NOT NULL,
+        inconsistent INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    db.execute(conn, '''
+    CREATE TABLE IF NOT EXISTS analytics_alternatives (
+        alternative TEXT PRIMARY KEY,
+        appearances INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        score_sum REAL NOT NULL
+    ) WITHOUT ROWID
+    ''')
+
+def _bucket(weight):
+    return min(int(weight * WEIGHT_BUCKETS), WEIGHT_BUCKETS - 1)
+
+def apply_session(conn, session, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) one analysis from the summary tables.
+
+    Args:
+        conn: connection, inside the caller's transaction
+        session: mapping with criteria, alternatives, criteria_weights,
+            final_scores and consistency_ratios
+        sign: 1 when the analysis is saved, -1 when it is replaced or deleted
+    """
+    criteria = list(session['criteria'])
+    alternatives = list(session['alternatives'])
+    criteria_weights = np.asarray(session['criteria_weights'], dtype=np.float64)
+    final_scores = np.asarray(session['final_scores'], dtype=np.float64)
+    ratios = session['consistency_ratios']
+
+    db.executemany(conn, '''
+    INSERT INTO analytics_criterion_weights (criterion, sessions, weight_sum, weight_sumsq)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (criterion) DO UPDATE SET
+        sessions = sessions + excluded.sessions,
+        weight_sum = weight_sum + excluded.weight_sum,
+        weight_sumsq = weight_sumsq + excluded.weight_sumsq
+    ''', [(c, sign, sign * float(w), sign * float(w) ** 2) for c, w in zip(criteria, criteria_weights)])
+    db.executemany(conn, '''
+    INSERT INTO analytics_weight_buckets (criterion, bucket, sessions) VALUES (?, ?, ?)
+    ON CONFLICT (criterion, bucket) DO UPDATE SET sessions = sessions + excluded.sessions
+    ''', [(c, _bucket(w), sign) for c, w in zip(criteria, criteria_weights)])
+
+    criteria_cr = [float(ratios['criteria'])] if 'criteria' in ratios else []
+    alternative_cr = [float(ratios[c]) for c in criteria if c in ratios]
+    db.executemany(conn, '''
+    INSERT INTO analytics_consistency (scope, matrices, cr_sum, cr_sumsq, inconsistent)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (scope) DO UPDATE SET
+        matrices = matrices + excluded.matrices,
+        cr_sum = cr_sum + excluded.cr_sum,
+        cr_sumsq = cr_sumsq + excluded.cr_sumsq,
+        inconsistent = inconsistent + excluded.inconsistent
+    ''', [
+        (scope, sign * len(values), sign * sum(values), sign * sum(v * v for v in values),
+         sign * sum(v >= CR_THRESHOLD for v in values))
+        for scope, values in (('criteria', criteria_cr), ('alternatives', alternative_cr))
+        if values
+    ])
+
+    winner = int(np.argmax(final_scores)) if final_scores.size else -1
+    db.executemany(conn, '''
+    INSERT INTO analytics_alternatives (alternative, appearances, wins, score_sum)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (alternative) DO UPDATE SET
+        appearances = appearances + excluded.appearances,
+        wins = wins + excluded.wins,
+        score_sum = score_sum + excluded.score_sum
+    ''', [(a, sign, sign * (i == winner), sign * float(s)) for i, (a, s) in enumerate(zip(alternatives, final_scores))])
+
+    if sign < 0:
+        # Không giữ lại các dòng đã về 0 (tiêu chí/phương án không còn xuất hiện)
+        db.execute(conn, "DELETE FROM analytics_criterion_weights WHERE sessions <= 0")
+        db.execute(conn, "DELETE FROM analytics_weight_buckets WHERE sessions <= 0")
+        db.execute(conn, "DELETE FROM analytics_consistency WHERE matrices <= 0")
+        db.execute(conn, "DELETE FROM analytics_alternatives WHERE appearances <= 0")
+
+def rebuild(conn, sessions):
+    """
+    Recompute every summary table (used by the migration)
+
+    Args:
+        conn: connection, inside the migration's transaction
+        sessions: decoded analytics fields of every stored analysis
+    """
+    for table in ('analytics_criterion_weights', 'analytics_weight_buckets',
+                  'analytics_consistency', 'analytics_alternatives'):
+        db.execute(conn, f"DELETE FROM {table}")
+    for session in sessions:
+        apply_session(conn, session)
+
+def get_criterion_weight_stats():
+    """
+    Weight distribution of each criterion name across saved analyses
+
+    Returns:
+        list of dicts with criterion, sessions, mean, std and buckets
+        (session counts per weight range of width 1/WEIGHT_BUCKETS)
+    """
+    with db.connection() as conn:
+        bucket_rows = db.execute(conn, "SELECT criterion, bucket, sessions FROM analytics_weight_buckets").fetchall()
+        weight_rows = db.execute(conn, '''
+        SELECT criterion, sessions, weight_sum, weight_sumsq FROM analytics_criterion_weights
+        ORDER BY sessions DESC, criterion
+        ''').fetchall()
+    buckets = {}
+    for criterion, bucket, sessions in bucket_rows:
+        buckets.setdefault(criterion, [0] * WEIGHT_BUCKETS)[bucket] = sessions
+
+    stats = []
+    for criterion, sessions, weight_sum, weight_sumsq in weight_rows:
+        mean = weight_sum / sessions
+        stats.append({
+            'criterion': criterion,
+            'sessions': sessions,
+            'mean': mean,
+            'std': float(np.sqrt(max(weight_sumsq / sessions - mean * mean, 0.0))),
+            'buckets': buckets.get(criterion, [0] * WEIGHT_BUCKETS),
+        })
+    return stats
+
+def get_consistency_stats():
+    """
+    Consistency ratio statistics for criteria matrices and alternative matrices
+
+    Returns:
+        dict of scope -> dict with matrices, mean, std and inconsistent_rate
+    """
+    with db.connection() as conn:
+        rows = db.execute(conn, '''
+        SELECT scope, matrices, cr_sum, cr_sumsq, inconsistent FROM analytics_consistency
+        ''').fetchall()
+    stats = {}
+    for scope, matrices, cr_sum, cr_sumsq, inconsistent in rows:
+        mean = cr_sum / matrices
+        stats[scope] = {
+            'matrices': matrices,
+            'mean': mean,
+            'std': float(np.sqrt(max(cr_sumsq / matrices - mean * mean, 0.0))),
+            'inconsistent_rate': inconsistent / matrices,
+        }
+    return stats
+
+def get_alternative_win_rates(limit=50):
+    """
+    How often each alternative name ranks first among the analyses it appears in
+
+    Returns:
+        list of dicts with alternative, appearances, wins, win_rate and mean_score
+    """
+    with db.connection() as conn:
+        rows = db.execute(conn, '''
+        SELECT alternative, appearances, wins, score_sum FROM analytics_alternatives
+        ORDER BY CAST(wins AS REAL) / appearances DESC, appearances DESC
+        LIMIT ?
+        ''', (limit,)).fetchall()
+    return [
+        {
+            'alternative': alternative,
+            'appearances': appearances,
+            'wins': wins,
+            'win_rate': wins / appearances,
+            'mean_score': score_sum / appearances,
+        }
+        for alternative, appearances, wins, score_sum in rows
+    ]
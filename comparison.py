@@ -0,0 +1,66 @@
+import numpy as np
+
+def _union_labels(label_lists):
+    """Labels of all lists in first-seen order"""
+    return list(dict.fromkeys(label for labels in label_lists for label in labels))
+
+def _aligned(values_list, label_lists, labels):
+    """Stack per-session vectors into a (sessions, labels) array, NaN where a label is missing"""
+    position = {label: k for k, label in enumerate(labels)}
+    aligned = np.full((len(values_list), len(labels)), np.nan)
+    for row, (values, session_labels) in enumerate(zip(values_list, label_lists)):
+        aligned[row, [position[label] for label in session_labels]] = values
+    return aligned
+
+def rank_matrix(scores):
+    """
+    Rank of every column within each row (1 = highest score), NaN where the score is NaN
+
+    Args:
+        scores: array of shape (sessions, alternatives)
+    """
+    filled = np.where(np.isnan(scores), -np.inf, scores)
+    ranks = np.argsort(np.argsort(-filled, axis=1, kind='stable'), axis=1) + 1.0
+    ranks[np.isnan(scores)] = np.nan
+    return ranks
+
+def align_sessions(sessions, baseline='previous'):
+    """
+    Align several analyses by criterion and alternative label.
+
+    Args:
+        sessions: mappings with criteria, alternatives, criteria_weights,
+            final_scores and consistency_ratios, in comparison order
+        baseline: 'previous' for deltas against the preceding session,
+            'first' for deltas against the first session
+
+    Returns:
+        dict with criteria, alternatives, criteria_weights (sessions, criteria),
+        final_scores and ranks (sessions, alternatives), their *_delta arrays
+        (NaN for the first session or missing labels), rank_change (positive
+        = moved up) and criteria_cr (sessions,)
+    """
+    criteria = _union_labels(s['criteria'] for s in sessions)
+    alternatives = _union_labels(s['alternatives'] for s in sessions)
+    weights = _aligned([s['criteria_weights'] for s in sessions], [s['criteria'] for s in sessions], criteria)
+    scores = _aligned([s['final_scores'] for s in sessions], [s['alternatives'] for s in sessions], alternatives)
+    ranks = rank_matrix(scores)
+
+    def delta(values):
+        result = np.full_like(values, np.nan)
+        if len(values) > 1:
+            reference = values[:-1] if baseline == 'previous' else values[:1]
+            result[1:] = values[1:] - reference
+        return result
+
+    return {
+        'criteria': criteria,
+        'alternatives': alternatives,
+        'criteria_weights': weights,
+        'criteria_weights_delta': delta(weights),
+        'final_scores': scores,
+        'final_scores_delta': delta(scores),
+        'ranks': ranks,
+        'rank_change': -delta(ranks),
+        'criteria_cr': np.array([float(s['consistency_ratios'].get('criteria', np.nan)) for s in sessions]),
+    }
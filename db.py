@@ -1,194 +1,1051 @@
 import sqlite3
 import json
+import hashlib
+import os
+import time
+import struct
+import logging
+import threading
+import queue
+from collections.abc import Mapping
+from contextlib import contextmanager
 from datetime import datetime
 import numpy as np
-import streamlit as st
+import analytics
+from ahp import calculate_all_results
 
-def init_db():
-    """Initialize the database"""
-    conn = sqlite3.connect('ahp_results.db')
-    c = conn.cursor()
-    
-    # Check if lambda_max_values and consistency_indices columns exist
-    c.execute("PRAGMA table_info(ahp_sessions)")
-    columns = [column[1] for column in c.fetchall()]
-    
-    if "lambda_max_values" not in columns or "consistency_indices" not in columns:
-        # Create a new table with all columns
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS ahp_sessions_new (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            description TEXT,
-            criteria TEXT,
-            alternatives TEXT,
-            criteria_matrix TEXT,
-            alternative_matrices TEXT,
-            criteria_weights TEXT,
-            alternative_weights TEXT,
-            final_scores TEXT,
-            consistency_ratios TEXT,
-            lambda_max_values TEXT,
-            consistency_indices TEXT,
-            timestamp TIMESTAMP
-        )
+# Đường dẫn CSDL và thời gian chờ khóa, có thể cấu hình qua biến môi trường
+DB_PATH = os.environ.get('AHP_DB_PATH', 'ahp_results.db')
+BUSY_TIMEOUT_MS = int(os.environ.get('AHP_DB_BUSY_TIMEOUT_MS', '5000'))
+SLOW_QUERY_MS = 200
+# Số kết nối tối đa dùng chung cho cả tiến trình
+POOL_SIZE = int(os.environ.get('AHP_DB_POOL_SIZE', '8'))
+
+_pool = queue.LifoQueue()
+_pool_slots = threading.BoundedSemaphore(POOL_SIZE)
+_config_generation = 0
+_query_stats = {}
+_stats_lock = threading.Lock()
+
+def configure(db_path=None, busy_timeout_ms=None):
+    """Configure the database path and busy timeout; pooled connections are reopened"""
+    global DB_PATH, BUSY_TIMEOUT_MS, _config_generation
+    if db_path is not None:
+        DB_PATH = db_path
+    if busy_timeout_ms is not None:
+        BUSY_TIMEOUT_MS = int(busy_timeout_ms)
+    _config_generation += 1
+
+def _open_connection():
+    """Open a connection in WAL mode that waits up to BUSY_TIMEOUT_MS for a locked database"""
+    # Pooled connections move between Streamlit's per-rerun script threads
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    return conn
+
+@contextmanager
+def connection():
+    """
+    Borrow a connection from the process-wide pool and return it afterwards.
+
+    At most POOL_SIZE connections are open; a borrower waits up to
+    BUSY_TIMEOUT_MS for a free one. Connections opened before the last
+    configure() call are closed instead of reused. Don't borrow a second
+    connection while holding one: pass the held connection down instead.
+    """
+    if not _pool_slots.acquire(timeout=BUSY_TIMEOUT_MS / 1000):
+        raise sqlite3.OperationalError(f"No free database connection (pool size {POOL_SIZE})")
+    try:
+        conn = None
+        while conn is None:
+            try:
+                conn, generation = _pool.get_nowait()
+            except queue.Empty:
+                conn, generation = _open_connection(), _config_generation
+            if generation != _config_generation:
+                conn.close()
+                conn = None
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            _pool.put((conn, generation))
+    finally:
+        _pool_slots.release()
+
+def close_connections():
+    """Close every idle pooled connection (borrowed ones are closed or reused on return)"""
+    while True:
+        try:
+            conn, _ = _pool.get_nowait()
+        except queue.Empty:
+            return
+        conn.close()
+
+def get_pool_stats():
+    """Pool size and the number of idle pooled connections"""
+    return {'size': POOL_SIZE, 'idle': _pool.qsize()}
+
+@contextmanager
+def transaction():
+    """Yield a pooled connection inside a transaction (commit or rollback)"""
+    with connection() as conn:
+        with conn:
+            yield conn
+
+def execute(conn, sql, params=()):
+    """Execute a statement and record its timing"""
+    started = time.perf_counter()
+    cursor = conn.execute(sql, params)
+    _record_query(sql, (time.perf_counter() - started) * 1000)
+    return cursor
+
+def executemany(conn, sql, seq_of_params):
+    """Execute a statement for every parameter tuple and record its timing"""
+    started = time.perf_counter()
+    cursor = conn.executemany(sql, seq_of_params)
+    _record_query(sql, (time.perf_counter() - started) * 1000)
+    return cursor
+
+def _record_query(sql, elapsed_ms):
+    key = ' '.join(sql.split())[:120]
+    with _stats_lock:
+        stats = _query_stats.setdefault(key, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+    if elapsed_ms > SLOW_QUERY_MS:
+        logging.warning(f"Slow query ({elapsed_ms:.1f} ms): {key}")
+
+def get_query_stats():
+    """Return a copy of per-statement timing stats: count, total_ms, max_ms"""
+    with _stats_lock:
+        return {sql: dict(stats) for sql, stats in _query_stats.items()}
+
+def reset_query_stats():
+    """Clear the collected query timings"""
+    with _stats_lock:
+        _query_stats.clear()
+
+# Ma trận và vector trọng số được lưu dạng BLOB: header (magic, dtype, ndim, shape) + raw bytes
+_BLOB_MAGIC = b'AHPA'
+_BLOB_HEADER = struct.Struct('<4s8sB')
+
+def encode_array(array):
+    """Encode a numeric array as a typed binary blob (dtype, shape, raw bytes)"""
+    array = np.ascontiguousarray(array)
+    if array.dtype.kind not in 'biuf':
+        array = array.astype(np.float64)
+    array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+    header = _BLOB_HEADER.pack(_BLOB_MAGIC, array.dtype.str.encode().ljust(8), array.ndim)
+    return header + struct.pack(f'<{array.ndim}I', *array.shape) + array.tobytes()
+
+def decode_array(blob):
+    """Decode a blob from encode_array; the result is a read-only view on the blob"""
+    magic, dtype, ndim = _BLOB_HEADER.unpack_from(blob)
+    if magic != _BLOB_MAGIC:
+        raise ValueError("Not an AHP array blob")
+    shape = struct.unpack_from(f'<{ndim}I', blob, _BLOB_HEADER.size)
+    offset = _BLOB_HEADER.size + 4 * ndim
+    return np.frombuffer(blob, dtype=dtype.rstrip().decode(), offset=offset).reshape(shape)
+
+def encode_array_dict(arrays, keys):
+    """Stack same-shaped arrays (e.g. one per criterion) in key order into one blob"""
+    if not keys:
+        return encode_array(np.empty((0, 0)))
+    return encode_array(np.stack([np.asarray(arrays[key]) for key in keys]))
+
+def decode_array_dict(blob, keys):
+    """Decode a stacked blob back into {key: view} without copying"""
+    stacked = decode_array(blob)
+    return {key: stacked[i] for i, key in enumerate(keys)}
+
+def _load_array(value):
+    """Load an array column stored as a blob (or legacy JSON text)"""
+    if isinstance(value, (bytes, memoryview)):
+        return decode_array(bytes(value))
+    return np.array(json.loads(value))
+
+def _load_array_dict(value, keys):
+    """Load a per-criterion array column stored as a blob (or legacy JSON text)"""
+    if isinstance(value, (bytes, memoryview)):
+        return decode_array_dict(bytes(value), keys)
+    return {k: np.array(v) for k, v in json.loads(value).items()}
+
+# Cột mà analytics.apply_session cần, theo thứ tự của _decode_analytics_row
+_ANALYTICS_COLUMNS = "id, criteria, alternatives, criteria_weights, final_scores, consistency_ratios"
+
+def _decode_analytics_row(row):
+    """
+    Decode the analytics fields of a stored row
+
+    Returns:
+        mapping for analytics.apply_session, or None (with a warning) when the
+        row is malformed, so one bad legacy row can't break the summary tables
+    """
+    row_id, criteria, alternatives, criteria_weights, final_scores, consistency_ratios = row
+    try:
+        session = {
+            'criteria': json.loads(criteria),
+            'alternatives': json.loads(alternatives),
+            'criteria_weights': _load_array(criteria_weights),
+            'final_scores': _load_array(final_scores),
+            'consistency_ratios': json.loads(consistency_ratios),
+        }
+        if (len(session['criteria_weights']) != len(session['criteria'])
+                or len(session['final_scores']) != len(session['alternatives'])
+                or not isinstance(session['consistency_ratios'], dict)):
+            raise ValueError("weights, scores and labels don't line up")
+    except (TypeError, ValueError) as e:
+        logging.warning(f"Skipping analytics of session {row_id}: {e}")
+        return None
+    return session
+
+def load_analytics_session(conn, session_id):
+    """Analytics fields of a stored session, or None if it is missing or malformed"""
+    row = execute(conn, f"SELECT {_ANALYTICS_COLUMNS} FROM ahp_sessions WHERE id = ?", (session_id,)).fetchone()
+    return _decode_analytics_row(row) if row is not None else None
+
+_init_lock = threading.Lock()
+_initialized_for = None
+
+def content_hash(criteria, alternatives, criteria_matrix, alternative_matrices):
+    """
+    Canonical SHA-256 of an analysis' labels and judgment matrices.
+    
+    Matrices are rounded to 10 decimals and hashed as little-endian float64
+    in criteria order, so the same judgments always give the same hash.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(criteria), list(alternatives)], ensure_ascii=False).encode('utf-8'))
+    
+    def add(matrix):
+        digest.update(np.round(np.asarray(matrix, dtype='<f8'), 10).tobytes())
+    
+    add(criteria_matrix)
+    for criterion in criteria:
+        add(alternative_matrices[criterion])
+    return digest.hexdigest()
+
+def _migrate_v1(conn):
+    """Base schema: ahp_sessions with lambda_max_values and consistency_indices"""
+    execute(conn, '''
+    CREATE TABLE IF NOT EXISTS ahp_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        description TEXT,
+        criteria TEXT,
+        alternatives TEXT,
+        criteria_matrix TEXT,
+        alternative_matrices TEXT,
+        criteria_weights TEXT,
+        alternative_weights TEXT,
+        final_scores TEXT,
+        consistency_ratios TEXT,
+        lambda_max_values TEXT,
+        consistency_indices TEXT,
+        timestamp TIMESTAMP
+    )
+    ''')
+    # Databases created before the consistency metrics were stored lack these columns
+    columns = {row[1] for row in execute(conn, "PRAGMA table_info(ahp_sessions)").fetchall()}
+    for column in ('lambda_max_values', 'consistency_indices'):
+        if column not in columns:
+            execute(conn, f"ALTER TABLE ahp_sessions ADD COLUMN {column} TEXT")
+
+def _migrate_v2(conn):
+    """Convert JSON matrix and weight columns to typed binary blobs"""
+    rows = execute(conn, '''
+    SELECT id, criteria, criteria_matrix, alternative_matrices, criteria_weights,
+    alternative_weights, final_scores
+    FROM ahp_sessions WHERE typeof(criteria_matrix) = 'text'
+    ''').fetchall()
+    updates = []
+    for row_id, criteria, criteria_matrix, alternative_matrices, criteria_weights, alternative_weights, final_scores in rows:
+        try:
+            criteria = json.loads(criteria)
+            alt_matrices = json.loads(alternative_matrices)
+            alt_weights = json.loads(alternative_weights)
+            if set(alt_matrices) != set(criteria) or set(alt_weights) != set(criteria):
+                # Keys don't line up with the criteria; leave the row as JSON
+                continue
+            updates.append((
+                encode_array(np.array(json.loads(criteria_matrix), dtype=np.float64)),
+                encode_array_dict({k: np.array(v, dtype=np.float64) for k, v in alt_matrices.items()}, criteria),
+                encode_array(np.array(json.loads(criteria_weights), dtype=np.float64)),
+                encode_array_dict({k: np.array(v, dtype=np.float64) for k, v in alt_weights.items()}, criteria),
+                encode_array(np.array(json.loads(final_scores), dtype=np.float64)),
+                row_id
+            ))
+        except (TypeError, ValueError) as e:
+            logging.warning(f"Skipping binary migration of session {row_id}: {e}")
+    executemany(conn, '''
+    UPDATE ahp_sessions SET criteria_matrix = ?, alternative_matrices = ?,
+    criteria_weights = ?, alternative_weights = ?, final_scores = ?
+    WHERE id = ?
+    ''', updates)
+
+def write_normalized(conn, session_id, criteria, alternatives, criteria_matrix,
+                     alternative_matrices, criteria_weights, alternative_weights, final_scores):
+    """
+    Write the normalized label, judgment and priority rows of one session.
+    
+    Judgments keep only the upper triangle (the lower one is its reciprocal);
+    criterion '' denotes the criteria matrix. Runs inside the caller's transaction.
+    """
+    for table in ('analysis_labels', 'judgments', 'priorities'):
+        execute(conn, f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+    
+    executemany(conn, "INSERT INTO analysis_labels (session_id, kind, position, label) VALUES (?, ?, ?, ?)",
+                [(session_id, 'criterion', i, label) for i, label in enumerate(criteria)] +
+                [(session_id, 'alternative', i, label) for i, label in enumerate(alternatives)])
+    
+    def upper_triangle(criterion, matrix, labels):
+        rows, cols = np.triu_indices(len(labels), k=1)
+        values = np.asarray(matrix, dtype=np.float64)[rows, cols].tolist()
+        return [(session_id, criterion, labels[i], labels[j], v)
+                for i, j, v in zip(rows.tolist(), cols.tolist(), values)]
+    
+    judgments = upper_triangle('', criteria_matrix, criteria)
+    for criterion in criteria:
+        judgments += upper_triangle(criterion, alternative_matrices[criterion], alternatives)
+    executemany(conn, '''
+    INSERT INTO judgments (session_id, criterion, row_label, col_label, value)
+    VALUES (?, ?, ?, ?, ?)
+    ''', judgments)
+    
+    priorities = [(session_id, 'criterion', '', label, w)
+                  for label, w in zip(criteria, np.asarray(criteria_weights, dtype=np.float64).tolist())]
+    for criterion in criteria:
+        priorities += [(session_id, 'alternative', criterion, label, w)
+                       for label, w in zip(alternatives, np.asarray(alternative_weights[criterion], dtype=np.float64).tolist())]
+    priorities += [(session_id, 'final', '', label, w)
+                   for label, w in zip(alternatives, np.asarray(final_scores, dtype=np.float64).tolist())]
+    executemany(conn, '''
+    INSERT INTO priorities (session_id, kind, criterion, label, weight)
+    VALUES (?, ?, ?, ?, ?)
+    ''', priorities)
+
+def _migrate_v3(conn):
+    """Normalized labels, judgments and priorities tables, backfilled from ahp_sessions"""
+    execute(conn, '''
+    CREATE TABLE IF NOT EXISTS analysis_labels (
+        session_id INTEGER NOT NULL REFERENCES ahp_sessions(id) ON DELETE CASCADE,
+        kind TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        label TEXT NOT NULL,
+        PRIMARY KEY (session_id, kind, position)
+    ) WITHOUT ROWID
+    ''')
+    execute(conn, "CREATE INDEX IF NOT EXISTS idx_labels_label ON analysis_labels (kind, label, session_id)")
+    execute(conn, '''
+    CREATE TABLE IF NOT EXISTS judgments (
+        session_id INTEGER NOT NULL REFERENCES ahp_sessions(id) ON DELETE CASCADE,
+        criterion TEXT NOT NULL,
+        row_label TEXT NOT NULL,
+        col_label TEXT NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (session_id, criterion, row_label, col_label)
+    ) WITHOUT ROWID
+    ''')
+    execute(conn, "CREATE INDEX IF NOT EXISTS idx_judgments_label ON judgments (criterion, row_label, col_label, session_id)")
+    execute(conn, '''
+    CREATE TABLE IF NOT EXISTS priorities (
+        session_id INTEGER NOT NULL REFERENCES ahp_sessions(id) ON DELETE CASCADE,
+        kind TEXT NOT NULL,
+        criterion TEXT NOT NULL,
+        label TEXT NOT NULL,
+        weight REAL NOT NULL,
+        PRIMARY KEY (session_id, kind, criterion, label)
+    ) WITHOUT ROWID
+    ''')
+    execute(conn, "CREATE INDEX IF NOT EXISTS idx_priorities_label ON priorities (kind, label, criterion, session_id)")
+    
+    rows = execute(conn, '''
+    SELECT id, criteria, alternatives, criteria_matrix, alternative_matrices,
+    criteria_weights, alternative_weights, final_scores FROM ahp_sessions
+    ''').fetchall()
+    for row_id, criteria, alternatives, criteria_matrix, alternative_matrices, criteria_weights, alternative_weights, final_scores in rows:
+        try:
+            criteria = json.loads(criteria)
+            write_normalized(
+                conn, row_id, criteria, json.loads(alternatives),
+                _load_array(criteria_matrix),
+                _load_array_dict(alternative_matrices, criteria),
+                _load_array(criteria_weights),
+                _load_array_dict(alternative_weights, criteria),
+                _load_array(final_scores)
+            )
+        except (TypeError, ValueError, KeyError, IndexError) as e:
+            logging.warning(f"Skipping normalization of session {row_id}: {e}")
+
+def _migrate_v4(conn):
+    """Index for keyset pagination and FTS5 search over name and description"""
+    execute(conn, "CREATE INDEX IF NOT EXISTS idx_sessions_timestamp ON ahp_sessions (timestamp DESC, id DESC)")
+    try:
+        execute(conn, '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS ahp_sessions_fts
+        USING fts5(name, description, content='ahp_sessions', content_rowid='id')
         ''')
-        
-        # Copy data from old table if it exists
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ahp_sessions'")
-        if c.fetchone():
-            c.execute('''
-            INSERT INTO ahp_sessions_new 
-            (id, name, description, criteria, alternatives, criteria_matrix, alternative_matrices, 
-            criteria_weights, alternative_weights, final_scores, consistency_ratios, timestamp)
-            SELECT id, name, description, criteria, alternatives, criteria_matrix, alternative_matrices, 
-            criteria_weights, alternative_weights, final_scores, consistency_ratios, timestamp
-            FROM ahp_sessions
-            ''')
-            
-            # Drop old table and rename new one
-            c.execute("DROP TABLE ahp_sessions")
-            c.execute("ALTER TABLE ahp_sessions_new RENAME TO ahp_sessions")
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5: search falls back to LIKE
+        logging.warning(f"FTS5 unavailable, past-session search uses LIKE: {e}")
+        return
+    execute(conn, '''
+    CREATE TRIGGER IF NOT EXISTS ahp_sessions_fts_ai AFTER INSERT ON ahp_sessions BEGIN
+        INSERT INTO ahp_sessions_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    ''')
+    execute(conn, '''
+    CREATE TRIGGER IF NOT EXISTS ahp_sessions_fts_ad AFTER DELETE ON ahp_sessions BEGIN
+        INSERT INTO ahp_sessions_fts (ahp_sessions_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    ''')
+    execute(conn, '''
+    CREATE TRIGGER IF NOT EXISTS ahp_sessions_fts_au AFTER UPDATE OF name, description ON ahp_sessions BEGIN
+        INSERT INTO ahp_sessions_fts (ahp_sessions_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO ahp_sessions_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    ''')
+    execute(conn, "INSERT INTO ahp_sessions_fts (ahp_sessions_fts) VALUES ('rebuild')")
+
+def _migrate_v5(conn):
+    """
+    Content hash per analysis; collapse existing exact duplicates.
+    
+    Rows are only collapsed when their name and description match as well, so
+    no user-entered metadata is lost. Rows with equal judgments but different
+    metadata keep their own row, which is why the index isn't unique.
+    """
+    execute(conn, "ALTER TABLE ahp_sessions ADD COLUMN content_hash TEXT")
+    rows = execute(conn, '''
+    SELECT id, name, description, criteria, alternatives, criteria_matrix, alternative_matrices, timestamp
+    FROM ahp_sessions ORDER BY timestamp DESC, id DESC
+    ''').fetchall()
+    survivors = {}
+    hashes = []
+    duplicates = []
+    for row_id, name, description, criteria, alternatives, criteria_matrix, alternative_matrices, timestamp in rows:
+        try:
+            criteria = json.loads(criteria)
+            digest = content_hash(
+                criteria, json.loads(alternatives),
+                _load_array(criteria_matrix),
+                _load_array_dict(alternative_matrices, criteria)
+            )
+        except (TypeError, ValueError, KeyError) as e:
+            logging.warning(f"Cannot hash session {row_id}, leaving it unhashed: {e}")
+            continue
+        # Rows come newest first, so the first row per hash and metadata keeps the latest timestamp
+        key = (digest, name, description)
+        if key in survivors:
+            duplicates.append((row_id,))
+        else:
+            survivors[key] = row_id
+            hashes.append((digest, row_id))
+    executemany(conn, "DELETE FROM ahp_sessions WHERE id = ?", duplicates)
+    executemany(conn, "UPDATE ahp_sessions SET content_hash = ? WHERE id = ?", hashes)
+    execute(conn, "CREATE INDEX IF NOT EXISTS idx_sessions_content_hash ON ahp_sessions (content_hash)")
+    if duplicates:
+        logging.info(f"Removed {len(duplicates)} duplicate analyses")
+
+def _migrate_v6(conn):
+    """Revision history: analysis_uid on sessions plus snapshot/delta revisions"""
+    execute(conn, "ALTER TABLE ahp_sessions ADD COLUMN analysis_uid TEXT")
+    execute(conn, "CREATE INDEX IF NOT EXISTS idx_sessions_analysis_uid ON ahp_sessions (analysis_uid)")
+    execute(conn, '''
+    CREATE TABLE IF NOT EXISTS ahp_revisions (
+        session_id INTEGER NOT NULL REFERENCES ahp_sessions(id) ON DELETE CASCADE,
+        revision INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        labels TEXT,
+        payload BLOB NOT NULL,
+        changed_cells INTEGER NOT NULL,
+        timestamp TIMESTAMP,
+        PRIMARY KEY (session_id, revision)
+    ) WITHOUT ROWID
+    ''')
+
+def _migrate_v7(conn):
+    """Autosaved drafts of analyses that haven't been calculated yet"""
+    execute(conn, '''
+    CREATE TABLE IF NOT EXISTS ahp_drafts (
+        draft_key TEXT PRIMARY KEY,
+        meta TEXT NOT NULL,
+        criteria_matrix BLOB,
+        alternative_matrices BLOB,
+        updated_at TIMESTAMP NOT NULL
+    )
+    ''')
+    execute(conn, "CREATE INDEX IF NOT EXISTS idx_drafts_updated_at ON ahp_drafts (updated_at)")
+
+def _migrate_v8(conn):
+    """Incrementally maintained cross-session summary tables (see analytics.py)"""
+    analytics.create_tables(conn)
+    rows = execute(conn, f"SELECT {_ANALYTICS_COLUMNS} FROM ahp_sessions").fetchall()
+    sessions = (_decode_analytics_row(row) for row in rows)
+    analytics.rebuild(conn, [session for session in sessions if session is not None])
+
+def _migrate_v9(conn):
+    """Content hashes are unique per analysis_uid, not across analyses"""
+    execute(conn, "CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_uid_content_hash ON ahp_sessions (analysis_uid, content_hash)")
+
+# Danh sách migration theo thứ tự; phiên bản lược đồ = số phần tử đã áp dụng
+MIGRATIONS = [
+    _migrate_v1,
+    _migrate_v2,
+    _migrate_v3,
+    _migrate_v4,
+    _migrate_v5,
+    _migrate_v6,
+    _migrate_v7,
+    _migrate_v8,
+    _migrate_v9,
+]
+
+def _run_migrations(conn):
+    """Apply pending migrations, tracking the schema version in PRAGMA user_version"""
+    version = execute(conn, "PRAGMA user_version").fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return
+    
+    # BEGIN IMMEDIATE takes the write lock, so concurrent processes migrate one at a time
+    execute(conn, "BEGIN IMMEDIATE")
+    try:
+        version = execute(conn, "PRAGMA user_version").fetchone()[0]
+        for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logging.info(f"Migrating database schema to version {target}")
+            migration(conn)
+            execute(conn, f"PRAGMA user_version = {target}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def init_db():
+    """Initialize the database once per process (no-op on Streamlit reruns)"""
+    global _initialized_for
+    if _initialized_for == DB_PATH:
+        return
+    with _init_lock:
+        if _initialized_for == DB_PATH:
+            return
+        with connection() as conn:
+            _run_migrations(conn)
+        prune_drafts()
+        _initialized_for = DB_PATH
+
+# Mỗi SNAPSHOT_INTERVAL phiên bản lưu một ảnh chụp đầy đủ để giới hạn số delta cần áp dụng
+SNAPSHOT_INTERVAL = 10
+_DELTA_HEADER = struct.Struct('<4sI')
+_DELTA_MAGIC = b'AHPD'
+
+def _flatten_matrices(criteria, criteria_matrix, alternative_matrices):
+    """All judgments of an analysis as one flat float64 vector (criteria matrix first)"""
+    parts = [np.asarray(criteria_matrix, dtype='<f8').ravel()]
+    parts += [np.asarray(alternative_matrices[c], dtype='<f8').ravel() for c in criteria]
+    return np.concatenate(parts)
+
+def _unflatten_matrices(flat, criteria, alternatives):
+    n, m = len(criteria), len(alternatives)
+    criteria_matrix = flat[:n * n].reshape(n, n)
+    stacked = flat[n * n:].reshape(n, m, m)
+    return criteria_matrix, {c: stacked[i] for i, c in enumerate(criteria)}
+
+def _encode_delta(indices, values):
+    """Sparse delta: changed cell positions (uint32) followed by their new values (float64)"""
+    return (_DELTA_HEADER.pack(_DELTA_MAGIC, len(indices))
+            + np.asarray(indices, dtype='<u4').tobytes()
+            + np.asarray(values, dtype='<f8').tobytes())
+
+def _decode_delta(blob):
+    magic, count = _DELTA_HEADER.unpack_from(blob)
+    if magic != _DELTA_MAGIC:
+        raise ValueError("Not an AHP delta blob")
+    offset = _DELTA_HEADER.size
+    indices = np.frombuffer(blob, dtype='<u4', count=count, offset=offset)
+    values = np.frombuffer(blob, dtype='<f8', count=count, offset=offset + 4 * count)
+    return indices, values
+
+def _write_revision(conn, session_id, labels, old_flat, new_flat, timestamp):
+    """
+    Append a revision for a session: a sparse delta of changed cells, or a full
+    snapshot when the labels changed or SNAPSHOT_INTERVAL revisions have passed
+    """
+    last = execute(conn, '''
+    SELECT MAX(revision), MAX(CASE WHEN kind = 'snapshot' THEN revision END)
+    FROM ahp_revisions WHERE session_id = ?
+    ''', (session_id,)).fetchone()
+    revision = (last[0] or 0) + 1
+    last_snapshot = last[1] or 0
+    
+    if old_flat is None or old_flat.shape != new_flat.shape or revision - last_snapshot >= SNAPSHOT_INTERVAL:
+        kind, payload, changed = 'snapshot', encode_array(new_flat), int(new_flat.size)
+        labels_json = json.dumps(labels)
     else:
-        # Just create the table if it doesn't exist yet
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS ahp_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            description TEXT,
-            criteria TEXT,
-            alternatives TEXT,
-            criteria_matrix TEXT,
-            alternative_matrices TEXT,
-            criteria_weights TEXT,
-            alternative_weights TEXT,
-            final_scores TEXT,
-            consistency_ratios TEXT,
-            lambda_max_values TEXT,
-            consistency_indices TEXT,
-            timestamp TIMESTAMP
-        )
-        ''')
+        indices = np.flatnonzero(old_flat != new_flat)
+        kind, payload, changed = 'delta', _encode_delta(indices, new_flat[indices]), int(indices.size)
+        labels_json = None
     
-    conn.commit()
-    conn.close()
+    execute(conn, '''
+    INSERT INTO ahp_revisions (session_id, revision, kind, labels, payload, changed_cells, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (session_id, revision, kind, labels_json, payload, changed, timestamp))
+    return revision
 
-def save_results():
-    """Save current results to database"""
-    conn = sqlite3.connect('ahp_results.db')
-    c = conn.cursor()
+def _session_row_values(results, digest, timestamp):
+    """Column values shared by INSERT and in-place UPDATE of a session row"""
+    def dumps_or_none(value):
+        return json.dumps(value) if value is not None else None
     
-    # Check if lambda_max_values and consistency_indices exist in session state
-    lambda_max_values = json.dumps(st.session_state.lambda_max_values) if hasattr(st.session_state, 'lambda_max_values') else None
-    consistency_indices = json.dumps(st.session_state.consistency_indices) if hasattr(st.session_state, 'consistency_indices') else None
+    return (
+        results['name'],
+        results['description'],
+        json.dumps(results['criteria']),
+        json.dumps(results['alternatives']),
+        encode_array(results['criteria_matrix']),
+        encode_array_dict(results['alternative_matrices'], results['criteria']),
+        encode_array(results['criteria_weights']),
+        encode_array_dict(results['alternative_weights'], results['criteria']),
+        encode_array(results['final_scores']),
+        json.dumps(results['consistency_ratios']),
+        dumps_or_none(results.get('lambda_max_values')),
+        dumps_or_none(results.get('consistency_indices')),
+        timestamp,
+        digest,
+        results.get('analysis_uid'),
+    )
+
+def insert_results(conn, results):
+    """
+    Insert a plain result mapping and its normalized rows.
+    
+    Expected keys: name, description, criteria, alternatives, criteria_matrix,
+    alternative_matrices, criteria_weights, alternative_weights, final_scores,
+    consistency_ratios and optionally lambda_max_values, consistency_indices,
+    timestamp, analysis_uid.
+    
+    An analysis whose labels and matrices are already stored under the same
+    analysis_uid is not inserted again: the existing row gets the new name,
+    description and timestamp. Without an analysis_uid the stored row must
+    also have the same name, so another analysis with equal judgments keeps
+    its own row.
+    A changed analysis with a known analysis_uid is a revision: its row is
+    updated in place and the change is appended to ahp_revisions as a delta.
+    Runs inside the caller's transaction; returns the session id.
+    """
+    timestamp = results.get('timestamp') or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    criteria, alternatives = results['criteria'], results['alternatives']
+    digest = content_hash(criteria, alternatives, results['criteria_matrix'], results['alternative_matrices'])
+    # Only the same analysis counts as a duplicate; equal judgments in another analysis are a revision or a new row
+    if results.get('analysis_uid'):
+        existing = execute(conn, '''
+        SELECT id FROM ahp_sessions WHERE content_hash = ? AND analysis_uid = ? ORDER BY id DESC LIMIT 1
+        ''', (digest, results['analysis_uid'])).fetchone()
+    else:
+        existing = execute(conn, '''
+        SELECT id FROM ahp_sessions WHERE content_hash = ? AND analysis_uid IS NULL AND name = ?
+        ORDER BY id DESC LIMIT 1
+        ''', (digest, results['name'])).fetchone()
+    if existing:
+        execute(conn, '''
+        UPDATE ahp_sessions SET name = ?, description = ?, timestamp = ? WHERE id = ?
+        ''', (results['name'], results['description'], timestamp, existing[0]))
+        return existing[0]
     
-    # Check if the columns exist in the database
-    c.execute("PRAGMA table_info(ahp_sessions)")
-    columns = [column[1] for column in c.fetchall()]
+    new_flat = _flatten_matrices(criteria, results['criteria_matrix'], results['alternative_matrices'])
+    labels = [criteria, alternatives]
+    head = None
+    if results.get('analysis_uid'):
+        head = execute(conn, '''
+        SELECT id, criteria, alternatives, criteria_matrix, alternative_matrices, timestamp
+        FROM ahp_sessions WHERE analysis_uid = ? ORDER BY id DESC LIMIT 1
+        ''', (results['analysis_uid'],)).fetchone()
     
-    if "lambda_max_values" in columns and "consistency_indices" in columns:
-        c.execute('''
+    if head is None:
+        cursor = execute(conn, '''
         INSERT INTO ahp_sessions 
         (name, description, criteria, alternatives, criteria_matrix, alternative_matrices, 
         criteria_weights, alternative_weights, final_scores, consistency_ratios, 
-        lambda_max_values, consistency_indices, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            st.session_state.current_session_name,
-            st.session_state.current_session_description,
-            json.dumps(st.session_state.criteria),
-            json.dumps(st.session_state.alternatives),
-            json.dumps(st.session_state.criteria_matrix.tolist()),
-            json.dumps({k: v.tolist() for k, v in st.session_state.alternative_matrices.items()}),
-            json.dumps(st.session_state.criteria_weights.tolist()),
-            json.dumps({k: v.tolist() for k, v in st.session_state.alternative_weights.items()}),
-            json.dumps(st.session_state.final_scores.tolist()),
-            json.dumps(st.session_state.consistency_ratios),
-            lambda_max_values,
-            consistency_indices,
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ))
+        lambda_max_values, consistency_indices, timestamp, content_hash, analysis_uid)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', _session_row_values(results, digest, timestamp))
+        session_id = cursor.lastrowid
+        analytics.apply_session(conn, results)
+        if results.get('analysis_uid'):
+            _write_revision(conn, session_id, labels, None, new_flat, timestamp)
     else:
-        c.execute('''
-        INSERT INTO ahp_sessions 
-        (name, description, criteria, alternatives, criteria_matrix, alternative_matrices, 
-        criteria_weights, alternative_weights, final_scores, consistency_ratios, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            st.session_state.current_session_name,
-            st.session_state.current_session_description,
-            json.dumps(st.session_state.criteria),
-            json.dumps(st.session_state.alternatives),
-            json.dumps(st.session_state.criteria_matrix.tolist()),
-            json.dumps({k: v.tolist() for k, v in st.session_state.alternative_matrices.items()}),
-            json.dumps(st.session_state.criteria_weights.tolist()),
-            json.dumps({k: v.tolist() for k, v in st.session_state.alternative_weights.items()}),
-            json.dumps(st.session_state.final_scores.tolist()),
-            json.dumps(st.session_state.consistency_ratios),
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ))
-    
-    conn.commit()
-    conn.close()
+        session_id, old_criteria, old_alternatives, old_cm, old_am, old_timestamp = head
+        old_criteria, old_alternatives = json.loads(old_criteria), json.loads(old_alternatives)
+        old_flat = _flatten_matrices(old_criteria, _load_array(old_cm), _load_array_dict(old_am, old_criteria))
+        if old_criteria != criteria or old_alternatives != alternatives:
+            old_flat = None
+        # Rows saved before revisions were tracked get their current state as the base snapshot
+        has_revisions = execute(conn, "SELECT 1 FROM ahp_revisions WHERE session_id = ? LIMIT 1", (session_id,)).fetchone()
+        if not has_revisions:
+            _write_revision(conn, session_id, [old_criteria, old_alternatives], None,
+                            _flatten_matrices(old_criteria, _load_array(old_cm), _load_array_dict(old_am, old_criteria)),
+                            old_timestamp)
+        _write_revision(conn, session_id, labels, old_flat, new_flat, timestamp)
+        # Thay số liệu tổng hợp của phiên bản cũ bằng phiên bản mới
+        stored = load_analytics_session(conn, session_id)
+        if stored is not None:
+            analytics.apply_session(conn, stored, sign=-1)
+        analytics.apply_session(conn, results)
+        execute(conn, '''
+        UPDATE ahp_sessions SET
+        name = ?, description = ?, criteria = ?, alternatives = ?, criteria_matrix = ?, alternative_matrices = ?,
+        criteria_weights = ?, alternative_weights = ?, final_scores = ?, consistency_ratios = ?,
+        lambda_max_values = ?, consistency_indices = ?, timestamp = ?, content_hash = ?, analysis_uid = ?
+        WHERE id = ?
+        ''', _session_row_values(results, digest, timestamp) + (session_id,))
+    
+    write_normalized(
+        conn, session_id,
+        criteria,
+        alternatives,
+        results['criteria_matrix'],
+        results['alternative_matrices'],
+        results['criteria_weights'],
+        results['alternative_weights'],
+        results['final_scores']
+    )
+    return session_id
+
+def save_analysis(results):
+    """Save a plain result mapping; returns the session id (existing one for duplicates)"""
+    # Session row and its normalized rows are written in one transaction
+    with transaction() as conn:
+        return insert_results(conn, results)
 
 def get_past_sessions():
     """Get list of past sessions"""
-    conn = sqlite3.connect('ahp_results.db')
-    c = conn.cursor()
-    c.execute('SELECT id, name, timestamp FROM ahp_sessions ORDER BY timestamp DESC')
-    past_sessions = c.fetchall()
-    conn.close()
-    return past_sessions
+    with connection() as conn:
+        return execute(conn, 'SELECT id, name, timestamp FROM ahp_sessions ORDER BY timestamp DESC').fetchall()
 
-def get_session_data(session_id):
-    """Get data for a specific session"""
-    conn = sqlite3.connect('ahp_results.db')
-    c = conn.cursor()
-    
-    # Get column names
-    c.execute("PRAGMA table_info(ahp_sessions)")
-    columns = [column[1] for column in c.fetchall()]
-    
-    c.execute('SELECT * FROM ahp_sessions WHERE id = ?', (session_id,))
-    session_data_row = c.fetchone()
-    conn.close()
-    
-    if session_data_row:
-        # Create a dictionary mapping column names to values
-        session_data = {}
-        for i, column in enumerate(columns):
-            if i < len(session_data_row):
-                session_data[column] = session_data_row[i]
-        
-        # Parse JSON data for required fields
-        session_data['criteria'] = json.loads(session_data['criteria'])
-        session_data['alternatives'] = json.loads(session_data['alternatives'])
-        # Lưu cả dạng list để xuất PDF dễ dàng
-        session_data['criteria_matrix_list'] = json.loads(session_data['criteria_matrix'])
-        session_data['alternative_matrices_list'] = {k: v for k, v in json.loads(session_data['alternative_matrices']).items()}
-        # Dạng np.array cho tính toán
-        session_data['criteria_matrix'] = np.array(session_data['criteria_matrix_list'])
-        session_data['alternative_matrices'] = {k: np.array(v) for k, v in session_data['alternative_matrices_list'].items()}
-        session_data['criteria_weights'] = np.array(json.loads(session_data['criteria_weights']))
-        session_data['alternative_weights'] = {k: np.array(v) for k, v in json.loads(session_data['alternative_weights']).items()}
-        session_data['final_scores'] = np.array(json.loads(session_data['final_scores']))
-        session_data['consistency_ratios'] = json.loads(session_data['consistency_ratios'])
-        
-        # Parse JSON data for new fields if they exist
-        if 'lambda_max_values' in session_data and session_data['lambda_max_values'] is not None:
-            session_data['lambda_max_values'] = json.loads(session_data['lambda_max_values'])
-        
-        if 'consistency_indices' in session_data and session_data['consistency_indices'] is not None:
-            session_data['consistency_indices'] = json.loads(session_data['consistency_indices'])
+def _has_fts(conn):
+    row = execute(conn, "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ahp_sessions_fts'").fetchone()
+    return row is not None
+
+def _fts_query(search):
+    """Turn free text into an FTS5 prefix query: each word quoted and prefixed"""
+    terms = [term.replace('"', '""') for term in search.split()]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def get_sessions_page(limit=20, after=None, search=None):
+    """
+    Get one page of past sessions, newest first, using keyset pagination
+    
+    Args:
+        limit: Page size
+        after: (timestamp, id) of the last row of the previous page, None for the first page
+        search: Optional full-text search over name and description
         
-        return session_data
+    Returns:
+        tuple: (rows of (id, name, timestamp), cursor for the next page or None)
+    """
+    with connection() as conn:
+        clauses = []
+        params = []
+        join = ''
+    
+        if search and search.strip():
+            if _has_fts(conn):
+                join = 'JOIN ahp_sessions_fts f ON f.rowid = s.id'
+                clauses.append('ahp_sessions_fts MATCH ?')
+                params.append(_fts_query(search))
+            else:
+                clauses.append('(s.name LIKE ? OR s.description LIKE ?)')
+                params += [f"%{search.strip()}%"] * 2
+    
+        if after is not None:
+            clauses.append('(s.timestamp, s.id) < (?, ?)')
+            params += list(after)
+    
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = execute(conn, f'''
+        SELECT s.id, s.name, s.timestamp FROM ahp_sessions s {join}
+        {where}
+        ORDER BY s.timestamp DESC, s.id DESC
+        LIMIT ?
+        ''', params + [limit + 1]).fetchall()
+    
+    # One extra row tells us whether there is a next page
+    next_cursor = (rows[limit - 1][2], rows[limit - 1][0]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+# Cột tóm tắt được tải ngay; các phần nặng chỉ giải mã khi được truy cập
+SUMMARY_COLUMNS = (
+    'id', 'name', 'description', 'criteria', 'alternatives',
+    'criteria_weights', 'final_scores', 'consistency_ratios', 'timestamp', 'content_hash'
+)
+
+def _load_json_or_none(value, handle):
+    return json.loads(value) if value is not None else None
+
+_LAZY_COLUMNS = {
+    'criteria_matrix': lambda value, handle: _load_array(value),
+    'alternative_matrices': lambda value, handle: _load_array_dict(value, handle['criteria']),
+    'alternative_weights': lambda value, handle: _load_array_dict(value, handle['criteria']),
+    'lambda_max_values': _load_json_or_none,
+    'consistency_indices': _load_json_or_none,
+}
+
+class SessionHandle(Mapping):
+    """
+    Read-only, dict-like view of a saved session.
+    
+    Summary fields are decoded up front; matrices, alternative weights and
+    consistency metrics are fetched column by column on first access and
+    cached on the handle.
+    """
+    
+    def __init__(self, row):
+        summary = dict(zip(SUMMARY_COLUMNS, row))
+        summary['criteria'] = json.loads(summary['criteria'])
+        summary['alternatives'] = json.loads(summary['alternatives'])
+        summary['criteria_weights'] = _load_array(summary['criteria_weights'])
+        summary['final_scores'] = _load_array(summary['final_scores'])
+        summary['consistency_ratios'] = json.loads(summary['consistency_ratios'])
+        self._data = summary
     
-    return None
+    def __getitem__(self, key):
+        if key not in self._data:
+            if key not in _LAZY_COLUMNS:
+                raise KeyError(key)
+            with connection() as conn:
+                value = execute(
+                    conn,
+                    f"SELECT {key} FROM ahp_sessions WHERE id = ?",
+                    (self._data['id'],)
+                ).fetchone()
+            if value is None:
+                raise KeyError(key)
+            self._data[key] = _LAZY_COLUMNS[key](value[0], self)
+        return self._data[key]
+    
+    def __contains__(self, key):
+        # Optional metrics count as missing when the column is NULL (older rows)
+        if key in _LAZY_COLUMNS:
+            return self.get(key) is not None
+        return key in self._data
+    
+    def __iter__(self):
+        yield from SUMMARY_COLUMNS
+        yield from _LAZY_COLUMNS
+    
+    def __len__(self):
+        return len(SUMMARY_COLUMNS) + len(_LAZY_COLUMNS)
+    
+    def is_loaded(self, key):
+        """Whether a field has already been decoded"""
+        return key in self._data
+
+def load_session(session_id):
+    """Get a lazy SessionHandle for a session, or None if it doesn't exist"""
+    with connection() as conn:
+        row = execute(
+            conn,
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM ahp_sessions WHERE id = ?",
+            (session_id,)
+        ).fetchone()
+    return SessionHandle(row) if row else None
+
+def get_sessions_batch(session_ids):
+    """
+    Lazy SessionHandles for several sessions with one query
+    
+    Returns:
+        list of SessionHandle in the order of session_ids (missing ids are skipped)
+    """
+    session_ids = list(dict.fromkeys(session_ids))
+    if not session_ids:
+        return []
+    with connection() as conn:
+        rows = execute(
+            conn,
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM ahp_sessions WHERE id IN ({', '.join('?' * len(session_ids))})",
+            session_ids
+        ).fetchall()
+    handles = {row[0]: SessionHandle(row) for row in rows}
+    return [handles[session_id] for session_id in session_ids if session_id in handles]
+
+def get_session_data(session_id):
+    """Get data for a specific session, fully decoded"""
+    handle = load_session(session_id)
+    if handle is None:
+        return None
+    return {key: handle.get(key) for key in handle}
 
 def delete_session(session_id):
     """Delete a session from the database by id"""
-    conn = sqlite3.connect('ahp_results.db')
-    c = conn.cursor()
-    c.execute('DELETE FROM ahp_sessions WHERE id = ?', (session_id,))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    with transaction() as conn:
+        stored = load_analytics_session(conn, session_id)
+        if stored is not None:
+            analytics.apply_session(conn, stored, sign=-1)
+        execute(conn, 'DELETE FROM ahp_sessions WHERE id = ?', (session_id,))
+
+def get_criterion_weight_trend(criterion):
+    """
+    Weight of a criterion across all saved analyses, oldest first
+    
+    Returns:
+        list of (session_id, name, timestamp, weight)
+    """
+    with connection() as conn:
+        return execute(conn, '''
+        SELECT s.id, s.name, s.timestamp, p.weight
+        FROM priorities p JOIN ahp_sessions s ON s.id = p.session_id
+        WHERE p.kind = 'criterion' AND p.label = ? AND p.criterion = ''
+        ORDER BY s.timestamp
+        ''', (criterion,)).fetchall()
+
+def get_judgment_history(row_label, col_label, criterion=''):
+    """
+    Pairwise judgment row_label vs col_label across analyses, oldest first.
+    Use criterion='' for the criteria matrix, otherwise the criterion name.
+    
+    Returns:
+        list of (session_id, timestamp, value)
+    """
+    with connection() as conn:
+        return execute(conn, '''
+        SELECT s.id, s.timestamp,
+            CASE WHEN j.row_label = ? THEN j.value ELSE 1.0 / j.value END
+        FROM judgments j JOIN ahp_sessions s ON s.id = j.session_id
+        WHERE j.criterion = ?
+          AND ((j.row_label = ? AND j.col_label = ?) OR (j.row_label = ? AND j.col_label = ?))
+        ORDER BY s.timestamp
+        ''', (row_label, criterion, row_label, col_label, col_label, row_label)).fetchall()
+
+def get_revisions(session_id):
+    """
+    Revision list of a session, oldest first (payloads are not loaded)
+    
+    Returns:
+        list of (revision, kind, changed_cells, timestamp)
+    """
+    with connection() as conn:
+        return execute(conn, '''
+        SELECT revision, kind, changed_cells, timestamp FROM ahp_revisions
+        WHERE session_id = ? ORDER BY revision
+        ''', (session_id,)).fetchall()
+
+def load_revision(session_id, revision):
+    """
+    Reconstruct one revision from the nearest snapshot plus deltas.
+    
+    Revisions store judgments only (the session row holds the latest run's
+    results), so the results of the revision are recomputed from its matrices.
+    
+    Returns:
+        dict with criteria, alternatives, criteria_matrix, alternative_matrices,
+        timestamp and the keys of ahp.calculate_all_results, or None if the
+        revision doesn't exist
+    """
+    with connection() as conn:
+        rows = execute(conn, '''
+        SELECT revision, kind, labels, payload, timestamp FROM ahp_revisions
+        WHERE session_id = ? AND revision <= ? AND revision >= (
+            SELECT MAX(revision) FROM ahp_revisions
+            WHERE session_id = ? AND kind = 'snapshot' AND revision <= ?
+        )
+        ORDER BY revision
+        ''', (session_id, revision, session_id, revision)).fetchall()
+    if not rows or rows[-1][0] != revision:
+        return None
+    
+    _, _, labels, payload, _ = rows[0]
+    criteria, alternatives = json.loads(labels)
+    flat = decode_array(payload).copy()
+    for _, _, _, payload, _ in rows[1:]:
+        indices, values = _decode_delta(payload)
+        flat[indices] = values
+    
+    criteria_matrix, alternative_matrices = _unflatten_matrices(flat, criteria, alternatives)
+    revision_data = {
+        'criteria': criteria,
+        'alternatives': alternatives,
+        'criteria_matrix': criteria_matrix,
+        'alternative_matrices': alternative_matrices,
+        'timestamp': rows[-1][4],
+    }
+    revision_data.update(calculate_all_results(criteria_matrix, alternative_matrices, criteria, alternatives))
+    return revision_data
+
+# Bản nháp không được cập nhật sau DRAFT_MAX_AGE_DAYS ngày sẽ bị xóa
+DRAFT_MAX_AGE_DAYS = 30
+
+def upsert_draft(conn, draft):
+    """
+    Insert or replace a draft; runs inside the caller's transaction.
+    
+    Expected keys: draft_key, name, description, criteria, alternatives,
+    criteria_matrix and alternative_matrices (either may be None); any
+    other JSON-serializable keys under 'extra' are stored as-is.
+    """
+    criteria = draft['criteria']
+    alternative_matrices = draft.get('alternative_matrices') or {}
+    matrix_keys = [c for c in criteria if c in alternative_matrices]
+    meta = {
+        'name': draft.get('name', ''),
+        'description': draft.get('description', ''),
+        'criteria': criteria,
+        'alternatives': draft['alternatives'],
+        'matrix_keys': matrix_keys,
+        'extra': draft.get('extra') or {},
+    }
+    criteria_matrix = draft.get('criteria_matrix')
+    execute(conn, '''
+    INSERT OR REPLACE INTO ahp_drafts (draft_key, meta, criteria_matrix, alternative_matrices, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ''', (
+        draft['draft_key'],
+        json.dumps(meta),
+        encode_array(criteria_matrix) if criteria_matrix is not None else None,
+        encode_array_dict(alternative_matrices, matrix_keys) if matrix_keys else None,
+        draft.get('updated_at') or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    ))
+
+def load_draft(draft_key):
+    """
+    Load a draft by key
+    
+    Returns:
+        dict in the form accepted by upsert_draft plus updated_at, or None
+    """
+    with connection() as conn:
+        row = execute(conn, '''
+        SELECT meta, criteria_matrix, alternative_matrices, updated_at FROM ahp_drafts WHERE draft_key = ?
+        ''', (draft_key,)).fetchone()
+    if row is None:
+        return None
+    
+    meta, criteria_matrix, alternative_matrices, updated_at = row
+    draft = json.loads(meta)
+    matrix_keys = draft.pop('matrix_keys')
+    draft['draft_key'] = draft_key
+    draft['criteria_matrix'] = decode_array(criteria_matrix).copy() if criteria_matrix is not None else None
+    draft['alternative_matrices'] = (
+        {k: v.copy() for k, v in decode_array_dict(alternative_matrices, matrix_keys).items()}
+        if alternative_matrices is not None else {}
+    )
+    draft['updated_at'] = updated_at
+    return draft
+
+def delete_draft(draft_key):
+    """Delete a draft by key"""
+    with transaction() as conn:
+        execute(conn, "DELETE FROM ahp_drafts WHERE draft_key = ?", (draft_key,))
+
+def prune_drafts(max_age_days=DRAFT_MAX_AGE_DAYS):
+    """Delete drafts not updated for max_age_days; returns the number removed"""
+    cutoff = datetime.fromtimestamp(time.time() - max_age_days * 86400).strftime("%Y-%m-%d %H:%M:%S")
+    with transaction() as conn:
+        return execute(conn, "DELETE FROM ahp_drafts WHERE updated_at < ?", (cutoff,)).rowcount
@@ -0,0 +1,219 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from db import connection, init_db, insert_results, upsert_draft
+
+# Hàng đợi ghi nền (write-behind): giới hạn kích thước và số bản ghi mỗi giao dịch
+MAX_PENDING = 256
+BATCH_SIZE = 32
+ENQUEUE_TIMEOUT = 2.0
+FLUSH_TIMEOUT = 10.0
+# Bản nháp chỉ được ghi khi người dùng ngừng nhập trong DRAFT_DEBOUNCE_SECONDS giây
+DRAFT_DEBOUNCE_SECONDS = 2.0
+
+_queue = queue.Queue(maxsize=MAX_PENDING)
+_pending = {}
+_pending_lock = threading.Lock()
+_writer_thread = None
+_writer_lock = threading.Lock()
+_debounce_timers = {}
+_debounce_lock = threading.Lock()
+_stats = {
+    'submitted': 0,
+    'coalesced': 0,
+    'written': 0,
+    'batches': 0,
+    'failed': 0,
+    'sync_fallbacks': 0,
+    'debounced': 0,
+    'max_depth': 0,
+    'last_batch_ms': 0.0,
+}
+
+def _ensure_writer():
+    """Start the background writer thread on first use"""
+    global _writer_thread
+    if _writer_thread is not None and _writer_thread.is_alive():
+        return
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name="ahp-db-writer", daemon=True)
+            _writer_thread.start()
+
+def submit_write(key, write_fn, payload):
+    """
+    Queue write_fn(conn, payload) for the background writer.
+
+    Writes sharing a key are coalesced: if an earlier write with the same key
+    is still pending, its payload is replaced and only the latest one runs.
+    When the queue stays full for ENQUEUE_TIMEOUT seconds the write runs
+    synchronously instead, so nothing is dropped.
+    """
+    _ensure_writer()
+    with _pending_lock:
+        _stats['submitted'] += 1
+        if key in _pending:
+            _pending[key] = (write_fn, payload)
+            _stats['coalesced'] += 1
+            return
+        _pending[key] = (write_fn, payload)
+
+    try:
+        _queue.put(key, timeout=ENQUEUE_TIMEOUT)
+    except queue.Full:
+        with _pending_lock:
+            item = _pending.pop(key, None)
+            _stats['sync_fallbacks'] += 1
+        if item is not None:
+            _write_batch([item])
+        return
+
+    with _pending_lock:
+        _stats['max_depth'] = max(_stats['max_depth'], _queue.qsize())
+
+def submit_debounced(key, write_fn, payload, delay=DRAFT_DEBOUNCE_SECONDS):
+    """
+    Queue write_fn(conn, payload) once no newer write for key arrives within delay seconds.
+
+    Each call restarts the key's timer and replaces its payload, so a burst of
+    edits produces a single write carrying the latest state.
+    """
+    with _debounce_lock:
+        timer = _debounce_timers.get(key)
+        if timer is not None:
+            timer.cancel()
+            with _pending_lock:
+                _stats['debounced'] += 1
+        timer = threading.Timer(delay, _fire_debounced, args=(key, write_fn, payload))
+        timer.daemon = True
+        _debounce_timers[key] = timer
+        timer.start()
+
+def _fire_debounced(key, write_fn, payload):
+    with _debounce_lock:
+        if _debounce_timers.get(key) is not threading.current_thread():
+            return
+        del _debounce_timers[key]
+    submit_write(key, write_fn, payload)
+
+def _fire_all_debounced():
+    """Submit every write still waiting on its debounce timer"""
+    with _debounce_lock:
+        timers = list(_debounce_timers.values())
+        _debounce_timers.clear()
+    for timer in timers:
+        timer.cancel()
+        submit_write(timer.args[0], *timer.args[1:])
+
+def _write_batch(items):
+    """
+    Write a batch in one transaction; on failure retry items one by one.
+    Borrowing the connection is part of each attempt, so a pool timeout
+    is counted like any other failed write.
+    """
+    started = time.perf_counter()
+    try:
+        with connection() as conn:
+            with conn:
+                for write_fn, payload in items:
+                    write_fn(conn, payload)
+        written, failed = len(items), 0
+    except Exception as e:
+        logging.error(f"Write-behind batch of {len(items)} failed, retrying individually: {e}")
+        written, failed = 0, 0
+        for write_fn, payload in items:
+            try:
+                with connection() as conn:
+                    with conn:
+                        write_fn(conn, payload)
+                written += 1
+            except Exception as item_error:
+                failed += 1
+                logging.error(f"Write-behind item failed: {item_error}")
+
+    with _pending_lock:
+        _stats['written'] += written
+        _stats['failed'] += failed
+        _stats['batches'] += 1
+        _stats['last_batch_ms'] = (time.perf_counter() - started) * 1000
+
+def _writer_loop():
+    while True:
+        keys = [_queue.get()]
+        # Drain whatever else is already waiting, up to one batch
+        while len(keys) < BATCH_SIZE:
+            try:
+                keys.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        with _pending_lock:
+            items = [_pending.pop(key) for key in keys if key in _pending]
+        try:
+            if items:
+                # No-op once initialized; a failure here fails this batch, not the thread
+                init_db()
+                _write_batch(items)
+        except Exception as e:
+            # Các khóa đã rời _pending: ghi nhận là lỗi thay vì âm thầm bỏ mất, và giữ luồng ghi chạy tiếp
+            logging.error(f"Write-behind batch of {len(items)} lost: {e}")
+            with _pending_lock:
+                _stats['failed'] += len(items)
+        finally:
+            for _ in keys:
+                _queue.task_done()
+
+def flush(timeout=FLUSH_TIMEOUT):
+    """
+    Block until every queued write is committed or the timeout expires.
+
+    Returns:
+        bool: True if the queue drained completely
+    """
+    _fire_all_debounced()
+    if _writer_thread is None or not _writer_thread.is_alive():
+        return _queue.unfinished_tasks == 0
+    deadline = time.monotonic() + timeout
+    with _queue.all_tasks_done:
+        while _queue.unfinished_tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logging.warning(f"Write-behind flush timed out with {_queue.unfinished_tasks} writes pending")
+                return False
+            _queue.all_tasks_done.wait(remaining)
+    return True
+
+def get_writer_stats():
+    """Queue depth and throughput counters of the background writer"""
+    with _pending_lock:
+        stats = dict(_stats)
+    stats['depth'] = _queue.qsize()
+    with _debounce_lock:
+        stats['debouncing'] = len(_debounce_timers)
+    return stats
+
+def save_analysis_async(results, key):
+    """
+    Hand a plain result mapping to the background writer.
+    Repeated saves with the same key before the writer catches up are coalesced.
+    """
+    submit_write(('results', key), insert_results, results)
+
+def save_draft_async(draft):
+    """Debounced autosave of an in-progress analysis (see db.upsert_draft)"""
+    submit_debounced(('draft', draft['draft_key']), upsert_draft, draft)
+
+def cancel_draft(draft_key):
+    """Drop a draft write that is still waiting on its debounce timer"""
+    key = ('draft', draft_key)
+    with _debounce_lock:
+        timer = _debounce_timers.pop(key, None)
+    if timer is not None:
+        timer.cancel()
+    with _pending_lock:
+        _pending.pop(key, None)
+
+# Đảm bảo dữ liệu đang chờ được ghi xuống khi tiến trình kết thúc
+atexit.register(flush)
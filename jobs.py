@@ -0,0 +1,109 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Số tiến trình tính toán; mặc định dùng tất cả các nhân của máy
+MAX_WORKERS = int(os.environ.get('AHP_JOB_WORKERS', os.cpu_count() or 1))
+# Kết quả không được lấy sau JOB_TTL_SECONDS sẽ bị bỏ
+JOB_TTL_SECONDS = 600
+
+_pool = None
+_pool_lock = threading.Lock()
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def _get_pool():
+    """Start the process pool on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: workers don't inherit the server's threads or open SQLite connections
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+class JobHandle:
+    """
+    A submitted job: one or more tasks running in the process pool.
+    Progress is the share of finished tasks; result() combines their results.
+    """
+
+    def __init__(self, kind, futures, combine):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.created = time.monotonic()
+        self._futures = futures
+        self._combine = combine
+
+    def progress(self):
+        """Fraction of tasks finished, between 0 and 1"""
+        return sum(f.done() for f in self._futures) / len(self._futures)
+
+    def done(self):
+        return all(f.done() for f in self._futures)
+
+    def exception(self):
+        """First task exception, or None (only meaningful once done)"""
+        for future in self._futures:
+            if future.done() and not future.cancelled() and future.exception() is not None:
+                return future.exception()
+        return None
+
+    def result(self):
+        """Combined result of all tasks; raises the first task exception"""
+        return self._combine([f.result() for f in self._futures])
+
+    def cancel(self):
+        for future in self._futures:
+            future.cancel()
+
+def _single_or_list(results):
+    return results[0] if len(results) == 1 else results
+
+def submit_job(kind, tasks, combine=None):
+    """
+    Submit tasks to the worker pool.
+
+    Args:
+        kind: job type, used by the UI to route the result
+        tasks: list of (function, args); functions must be importable top-level
+            functions and args picklable
+        combine: called in this process with the list of task results;
+            defaults to the single result (or the list for several tasks)
+
+    Returns:
+        JobHandle
+    """
+    pool = _get_pool()
+    futures = [pool.submit(fn, *args) for fn, args in tasks]
+    handle = JobHandle(kind, futures, combine or _single_or_list)
+    with _jobs_lock:
+        _prune_jobs()
+        _jobs[handle.job_id] = handle
+    return handle
+
+def get_job(job_id):
+    """Handle of a job that hasn't been collected yet, or None"""
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def collect_job(job_id):
+    """Forget a finished job and return its handle"""
+    with _jobs_lock:
+        return _jobs.pop(job_id, None)
+
+def _prune_jobs():
+    """Drop finished jobs nobody collected within JOB_TTL_SECONDS (caller holds the lock)"""
+    now = time.monotonic()
+    for job_id in [j for j, h in _jobs.items() if h.done() and now - h.created > JOB_TTL_SECONDS]:
+        logging.info(f"Dropping uncollected {_jobs[job_id].kind} job {job_id}")
+        del _jobs[job_id]
+
+def get_job_stats():
+    """Pool size and number of running and waiting jobs"""
+    with _jobs_lock:
+        running = sum(not h.done() for h in _jobs.values())
+        return {'workers': MAX_WORKERS, 'running': running, 'uncollected': len(_jobs) - running}
@@ -4,6 +4,10 @@ from db import init_db
 from ui.create_analysis import show_create_analysis
 from ui.input_matrices import show_input_matrices
 from ui.view_results import show_view_results
+from ui.analytics_dashboard import show_analytics_dashboard
+from ui.state_adapter import restore_draft, autosave_draft, discard_draft
+from ui.state_store import touch_session, reload_evicted_state
+from ui.job_status import deliver_finished_jobs, show_job_progress
 
 # Set up the page
 st.set_page_config(page_title="AHP Decision Support System", layout="wide")
@@ -14,6 +18,10 @@ set_language('vi')
 # Initialize database
 init_db()
 
+# Phiên nhàn rỗi bị chuyển ma trận xuống bản nháp; nạp lại trước khi dùng
+touch_session()
+reload_evicted_state()
+
 # Initialize session state
 if 'criteria' not in st.session_state:
     st.session_state.criteria = []
@@ -40,6 +48,14 @@ if 'language' not in st.session_state:
 if 'current_tab' not in st.session_state:
     st.session_state.current_tab = "create_new_analysis"
 
+# Khôi phục bản nháp khi tải lại trang hoặc kết nối lại sau khi máy chủ khởi động lại
+if restore_draft():
+    st.toast("📝 Đã khôi phục bản nháp chưa tính toán", icon="📝")
+
+# Kết quả của các tác vụ nền đã xong được đưa vào session state trước khi vẽ trang
+deliver_finished_jobs()
+show_job_progress()
+
 # Language selector in sidebar
 with st.sidebar:
     # About AHP section
@@ -126,7 +142,7 @@ if 'switch_to_view_results_tab' in st.session_state and st.session_state.switch_
     """, unsafe_allow_html=True)
 
 # Tab selection interface
-col1, col2, col3 = st.columns(3)
+col1, col2, col3, col4 = st.columns(4)
 
 with col1:
     if st.button(get_text("create_new_analysis"), key="tab1", 
@@ -149,6 +165,13 @@ with col3:
         st.session_state.current_tab = "view_results"
         st.rerun()
 
+with col4:
+    if st.button(get_text("analytics_dashboard"), key="tab4", 
+                 use_container_width=True,
+                 type="primary" if st.session_state.current_tab == "analytics_dashboard" else "secondary"):
+        st.session_state.current_tab = "analytics_dashboard"
+        st.rerun()
+
 # st.divider()
 
 # Show content based on selected tab
@@ -158,9 +181,15 @@ elif st.session_state.current_tab == "input_matrices":
     show_input_matrices()
 elif st.session_state.current_tab == "view_results":
     show_view_results()
+elif st.session_state.current_tab == "analytics_dashboard":
+    show_analytics_dashboard()
+
+# Tự động lưu bản nháp (ghi trễ, gộp nhiều lần chỉnh sửa thành một lần ghi)
+autosave_draft()
 
 # Add a reset button
 if st.sidebar.button(get_text("reset_application")):
+    discard_draft()
     for key in list(st.session_state.keys()):
         del st.session_state[key]
     st.rerun()
\ No newline at end of file
@@ -0,0 +1,59 @@
+import streamlit as st
+import pandas as pd
+from utils.i18n import get_text
+from utils.formatting import format_decimal, format_percentage
+from analytics import (
+    CR_THRESHOLD, WEIGHT_BUCKETS,
+    get_criterion_weight_stats, get_consistency_stats, get_alternative_win_rates
+)
+
+def show_analytics_dashboard():
+    """Show portfolio-wide statistics read from the analytics summary tables"""
+    st.header(get_text("analytics_dashboard"))
+
+    criterion_stats = get_criterion_weight_stats()
+    if not criterion_stats:
+        st.info(get_text("no_past_analyses"))
+        return
+
+    # Chỉ số nhất quán trên toàn bộ các phân tích đã lưu
+    consistency = get_consistency_stats()
+    col1, col2 = st.columns(2)
+    for column, scope, label in ((col1, 'criteria', "Ma trận tiêu chí"), (col2, 'alternatives', "Ma trận phương án")):
+        with column:
+            stats = consistency.get(scope)
+            if stats:
+                st.metric(f"CR trung bình – {label}", format_decimal(stats['mean']),
+                          help=f"{stats['matrices']} ma trận, độ lệch chuẩn {format_decimal(stats['std'])}")
+                st.caption(f"Tỷ lệ CR ≥ {CR_THRESHOLD}: {format_percentage(stats['inconsistent_rate'])}")
+
+    # Phân bố trọng số theo tên tiêu chí
+    st.subheader(get_text("criteria_weights"))
+    weights_df = pd.DataFrame({
+        get_text("criterion"): [s['criterion'] for s in criterion_stats],
+        "Số phân tích": [s['sessions'] for s in criterion_stats],
+        "Trung bình": [format_decimal(s['mean']) for s in criterion_stats],
+        "Độ lệch chuẩn": [format_decimal(s['std']) for s in criterion_stats],
+    })
+    st.dataframe(weights_df, use_container_width=True, hide_index=True)
+
+    selected = st.selectbox(
+        "Phân bố trọng số của tiêu chí",
+        range(len(criterion_stats)),
+        format_func=lambda x: criterion_stats[x]['criterion'],
+        key="analytics_criterion"
+    )
+    bucket_labels = [f"{b / WEIGHT_BUCKETS:.1f}–{(b + 1) / WEIGHT_BUCKETS:.1f}" for b in range(WEIGHT_BUCKETS)]
+    st.bar_chart(pd.Series(criterion_stats[selected]['buckets'], index=bucket_labels, name="Số phân tích"))
+
+    # Tỷ lệ xếp hạng nhất của từng phương án
+    st.subheader("Tỷ lệ xếp hạng nhất của phương án")
+    win_rates = get_alternative_win_rates()
+    win_df = pd.DataFrame({
+        get_text("alternative"): [w['alternative'] for w in win_rates],
+        "Số phân tích": [w['appearances'] for w in win_rates],
+        "Số lần hạng nhất": [w['wins'] for w in win_rates],
+        "Tỷ lệ hạng nhất": [format_percentage(w['win_rate']) for w in win_rates],
+        "Điểm trung bình": [format_percentage(w['mean_score']) for w in win_rates],
+    })
+    st.dataframe(win_df, use_container_width=True, hide_index=True)
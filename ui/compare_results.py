@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from utils.i18n import get_text
+from utils.formatting import format_decimal, format_percentage
+from db import get_sessions_page, get_sessions_batch
+from comparison import align_sessions
+
+# Số phân tích tối đa trong danh sách chọn và trong một lần so sánh
+MAX_COMPARE_CHOICES = 200
+MAX_COMPARE_SESSIONS = 36
+
+RANK_UP_STYLE = 'background-color: #d4edda'
+RANK_DOWN_STYLE = 'background-color: #f8d7da'
+
+def _format_delta(value, delta, fmt):
+    if np.isnan(value):
+        return "–"
+    if np.isnan(delta):
+        return fmt(value)
+    sign = "+" if delta >= 0 else "−"
+    return f"{fmt(value)} ({sign}{fmt(abs(delta))})"
+
+def _format_rank(rank, change):
+    if np.isnan(rank):
+        return ""
+    arrow = "" if np.isnan(change) or change == 0 else (f" ▲{int(change)}" if change > 0 else f" ▼{int(-change)}")
+    return f" · #{int(rank)}{arrow}"
+
+def show_compare_results():
+    """Compare several saved analyses side by side, aligned by label"""
+    search = st.text_input("🔍 Tìm kiếm theo tên hoặc mô tả", key="compare_search")
+    rows, _ = get_sessions_page(limit=MAX_COMPARE_CHOICES, search=search)
+    if not rows:
+        st.info(get_text("no_past_analyses"))
+        return
+
+    labels = {row[0]: f"{row[1]} ({row[2]})" for row in rows}
+    selected_ids = st.multiselect(
+        "Chọn các phân tích cần so sánh",
+        list(labels),
+        format_func=labels.get,
+        max_selections=MAX_COMPARE_SESSIONS,
+        key="compare_selection"
+    )
+    if len(selected_ids) < 2:
+        st.info("Chọn ít nhất 2 phân tích để so sánh.")
+        return
+
+    # One query for all selected sessions; only summary columns are decoded
+    sessions = sorted(get_sessions_batch(selected_ids), key=lambda s: (s['timestamp'], s['id']))
+    baseline = st.radio(
+        "So sánh với",
+        ['previous', 'first'],
+        format_func=lambda x: "Phân tích liền trước" if x == 'previous' else "Phân tích đầu tiên",
+        horizontal=True,
+        key="compare_baseline"
+    )
+    aligned = align_sessions(sessions, baseline)
+    columns = [f"{s['name']} ({str(s['timestamp'])[:10]}) #{s['id']}" for s in sessions]
+
+    # Điểm cuối cùng: mỗi cột là một phân tích, tô màu khi thứ hạng thay đổi
+    st.subheader(get_text("final_scores"))
+    scores = aligned['final_scores']
+    scores_delta = aligned['final_scores_delta']
+    ranks = aligned['ranks']
+    rank_change = aligned['rank_change']
+    cells = [
+        [
+            _format_delta(scores[s, a], scores_delta[s, a], format_percentage) + _format_rank(ranks[s, a], rank_change[s, a])
+            for s in range(len(sessions))
+        ]
+        for a in range(len(aligned['alternatives']))
+    ]
+    scores_df = pd.DataFrame(cells, index=aligned['alternatives'], columns=columns)
+    styles = np.where(rank_change.T > 0, RANK_UP_STYLE, np.where(rank_change.T < 0, RANK_DOWN_STYLE, ''))
+    st.dataframe(
+        scores_df.style.apply(lambda _: pd.DataFrame(styles, index=scores_df.index, columns=scores_df.columns), axis=None),
+        use_container_width=True
+    )
+    st.caption("▲/▼: thay đổi thứ hạng so với phân tích được chọn làm mốc; – : phương án không có trong phân tích.")
+
+    st.line_chart(pd.DataFrame(scores, index=columns, columns=aligned['alternatives']))
+
+    # Trọng số tiêu chí và chênh lệch
+    st.subheader(get_text("criteria_weights"))
+    weights = aligned['criteria_weights']
+    weights_delta = aligned['criteria_weights_delta']
+    weights_df = pd.DataFrame(
+        [[_format_delta(weights[s, c], weights_delta[s, c], format_decimal) for s in range(len(sessions))]
+         for c in range(len(aligned['criteria']))],
+        index=aligned['criteria'],
+        columns=columns
+    )
+    st.dataframe(weights_df, use_container_width=True)
+
+    st.subheader(get_text("consistency_metrics"))
+    st.dataframe(
+        pd.DataFrame({"CR": [format_decimal(cr) for cr in aligned['criteria_cr']]}, index=columns).T,
+        use_container_width=True
+    )
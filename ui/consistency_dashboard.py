@@ -0,0 +1,45 @@
+import streamlit as st
+import pandas as pd
+from utils.i18n import get_text
+from utils.formatting import format_decimal
+from ahp import CONSISTENCY_THRESHOLD
+from ui.matrix_metrics import CRITERIA_KEY, get_all_metrics
+
+def _matrix_title(name):
+    if name == CRITERIA_KEY:
+        return get_text("criteria_comparison")
+    return f"{get_text('alternative_comparison')} {name}"
+
+def _format_cell(labels, cell):
+    i, j, value, suggested = cell
+    return f"{labels[i]} / {labels[j]}: {format_decimal(value, 2)} → {format_decimal(suggested, 2)}"
+
+def inconsistent_matrices():
+    """Titles of the matrices whose CR is not acceptable, from the shared metrics cache"""
+    return [_matrix_title(name) for name, metrics in get_all_metrics().items()
+            if metrics['cr'] >= CONSISTENCY_THRESHOLD]
+
+def show_consistency_dashboard():
+    """
+    Consistency overview of every matrix with its most inconsistent cells.
+
+    Metrics come from the shared cache, so only matrices edited since the last
+    rerun are recomputed.
+    """
+    all_metrics = get_all_metrics()
+    inconsistent = [name for name, metrics in all_metrics.items() if metrics['cr'] >= CONSISTENCY_THRESHOLD]
+
+    label = f"📊 Tổng quan nhất quán – {len(all_metrics) - len(inconsistent)}/{len(all_metrics)} ma trận đạt"
+    with st.expander(label, expanded=bool(inconsistent)):
+        rows = []
+        for name, metrics in all_metrics.items():
+            labels = st.session_state.criteria if name == CRITERIA_KEY else st.session_state.alternatives
+            rows.append({
+                "Ma trận": _matrix_title(name),
+                "CR": format_decimal(metrics['cr']),
+                "Trạng thái": "✅" if metrics['cr'] < CONSISTENCY_THRESHOLD else "❌",
+                "Ô lệch nhiều nhất (hiện tại → gợi ý)": "; ".join(
+                    _format_cell(labels, cell) for cell in metrics['worst_cells']
+                ) if metrics['cr'] >= CONSISTENCY_THRESHOLD else "",
+            })
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
@@ -1,8 +1,12 @@
+import uuid
 import streamlit as st
 import numpy as np
 import pandas as pd
 from utils.i18n import get_text
-from utils.validation import validate_name, validate_analysis_setup
+from ui.matrix_metrics import clear_matrix_metrics
+from ui.structure_edits import sync_matrix_structure, rename_label, set_matrix_labels, clear_pending
+from ui.edit_log import clear_edit_log, rename_in_log
+from utils.validation import validate_name, validate_analysis_setup, MAX_CRITERIA, MAX_ALTERNATIVES
 
 def show_create_analysis():
     """Show the create analysis UI"""
@@ -44,7 +48,7 @@ def show_create_analysis():
         new_criteria_batch = st.text_area(
             get_text("add_criterion_batch"),
             placeholder="Tiêu chí 1\nTiêu chí 2\nTiêu chí 3",
-            help="Nhập mỗi tiêu chí trên một dòng để thêm nhiều tiêu chí cùng lúc (Tối đa 9 tiêu chí)",
+            help=f"Nhập mỗi tiêu chí trên một dòng để thêm nhiều tiêu chí cùng lúc (Tối đa {MAX_CRITERIA} tiêu chí)",
             value=criteria_value,
             key="criteria_input"
         )
@@ -64,7 +68,7 @@ def show_create_analysis():
             # Process each criterion with limit check
             for criterion in criteria_list:
                 # Check if adding this criterion would exceed the limit
-                if current_count + added_count >= 9:
+                if current_count + added_count >= MAX_CRITERIA:
                     rejected_count += 1
                     rejected_items.append(criterion)
                     continue
@@ -78,6 +82,8 @@ def show_create_analysis():
             
             # Show results
             if added_count > 0:
+                # Existing judgments are kept; only pairs with the new tiêu chí are asked for
+                sync_matrix_structure()
                 st.toast(f"Đã thêm {added_count} tiêu chí thành công!", icon="✅")
                 # Set flag to clear text area on next run
                 st.session_state.clear_criteria_input = True
@@ -85,7 +91,7 @@ def show_create_analysis():
             
             # Show warning for rejected items
             if rejected_count > 0:
-                st.toast(f"Giới hạn tối đa 9 tiêu chí!", icon="⚠️")
+                st.toast(f"Giới hạn tối đa {MAX_CRITERIA} tiêu chí!", icon="⚠️")
         
         # Reset clear flag after text area is rendered
         if st.session_state.clear_criteria_input:
@@ -171,6 +177,8 @@ def show_create_analysis():
                                 other_criteria = [c for j, c in enumerate(st.session_state.criteria) if j != i]
                                 valid, message = validate_name(new_name.strip(), other_criteria)
                                 if valid:
+                                    rename_label('criteria', st.session_state.criteria[i], new_name.strip())
+                                    rename_in_log('criteria', st.session_state.criteria[i], new_name.strip())
                                     st.session_state.criteria[i] = new_name.strip()
                                     st.session_state.editing_criterion_index = None
                                     st.session_state.edit_criterion_text = ""
@@ -204,6 +212,7 @@ def show_create_analysis():
                                    help=f"Xóa tiêu chí: {criterion}",
                                    type="secondary"):
                             st.session_state.criteria.remove(criterion)
+                            sync_matrix_structure()
                             st.toast(f"🗑️ Đã xóa tiêu chí: {criterion}", icon="🗑️")
                             st.rerun()
         else:
@@ -226,7 +235,7 @@ def show_create_analysis():
         new_alternatives_batch = st.text_area(
             get_text("add_alternative_batch"),
             placeholder="Phương án 1\nPhương án 2\nPhương án 3",
-            help="Nhập mỗi phương án trên một dòng để thêm nhiều phương án cùng lúc (Tối đa 15 phương án)",
+            help=f"Nhập mỗi phương án trên một dòng để thêm nhiều phương án cùng lúc (Tối đa {MAX_ALTERNATIVES} phương án)",
             value=alternatives_value,
             key="alternatives_input"
         )
@@ -246,7 +255,7 @@ def show_create_analysis():
             # Process each alternative with limit check
             for alternative in alternatives_list:
                 # Check if adding this alternative would exceed the limit
-                if current_count + added_count >= 15:
+                if current_count + added_count >= MAX_ALTERNATIVES:
                     rejected_count += 1
                     rejected_items.append(alternative)
                     continue
@@ -260,6 +269,8 @@ def show_create_analysis():
             
             # Show results
             if added_count > 0:
+                # Existing judgments are kept; only pairs with the new phương án are asked for
+                sync_matrix_structure()
                 st.toast(f"Đã thêm {added_count} phương án thành công!", icon="✅")
                 # Set flag to clear text area on next run
                 st.session_state.clear_alternatives_input = True
@@ -267,7 +278,7 @@ def show_create_analysis():
             
             # Show warning for rejected items
             if rejected_count > 0:
-                st.toast(f"Giới hạn tối đa 15 phương án!", icon="⚠️")
+                st.toast(f"Giới hạn tối đa {MAX_ALTERNATIVES} phương án!", icon="⚠️")
         
         # Reset clear flag after text area is rendered
         if st.session_state.clear_alternatives_input:
@@ -334,6 +345,8 @@ def show_create_analysis():
                                 other_alternatives = [a for j, a in enumerate(st.session_state.alternatives) if j != i]
                                 valid, message = validate_name(new_name.strip(), other_alternatives)
                                 if valid:
+                                    rename_label('alternatives', st.session_state.alternatives[i], new_name.strip())
+                                    rename_in_log('alternatives', st.session_state.alternatives[i], new_name.strip())
                                     st.session_state.alternatives[i] = new_name.strip()
                                     st.session_state.editing_alternative_index = None
                                     st.session_state.edit_alternative_text = ""
@@ -367,6 +380,7 @@ def show_create_analysis():
                                    help=f"Xóa phương án: {alternative}",
                                    type="secondary"):
                             st.session_state.alternatives.remove(alternative)
+                            sync_matrix_structure()
                             st.toast(f"Đã xóa phương án: {alternative}", icon="🗑️")
                             st.rerun()
         else:
@@ -375,18 +389,20 @@ def show_create_analysis():
     # Initialize matrices button with validation
     st.markdown("---")
     
-    # Clear any temporary calculations when re-initializing
     criteria_count = len(st.session_state.criteria)
     alternatives_count = len(st.session_state.alternatives)
-    if 'temp_criteria_weights' in st.session_state:
-        del st.session_state.temp_criteria_weights
-    if 'temp_alternative_weights' in st.session_state:
-        del st.session_state.temp_alternative_weights
-    if 'temp_consistency_ratios' in st.session_state:
-        del st.session_state.temp_consistency_ratios
     
     # Initialize matrices button with enhanced validation
     is_name_empty = not session_name or not session_name.strip()
+    # Ma trận đã có: thay đổi cấu trúc giữ nguyên các đánh giá cũ, trừ khi chọn làm lại từ đầu
+    has_matrices = st.session_state.get('criteria_matrix') is not None
+    reset_judgments = False
+    if has_matrices:
+        reset_judgments = st.checkbox(
+            "Đặt lại toàn bộ đánh giá về 1",
+            key="reset_judgments",
+            help="Mặc định các đánh giá đã nhập được giữ lại; chỉ các cặp có tiêu chí/phương án mới cần đánh giá thêm"
+        )
     init_button = st.button(
         get_text("initialize_matrices"), 
         type="primary", 
@@ -401,15 +417,27 @@ def show_create_analysis():
         
         valid, message = validate_analysis_setup()
         if valid:
-            n_criteria = len(st.session_state.criteria)
-            st.session_state.criteria_matrix = np.ones((n_criteria, n_criteria))
-            
-            # Initialize alternative matrices for each criterion
-            st.session_state.alternative_matrices = {}
-            for criterion in st.session_state.criteria:
-                n_alternatives = len(st.session_state.alternatives)
-                st.session_state.alternative_matrices[criterion] = np.ones((n_alternatives, n_alternatives))
+            if has_matrices and not reset_judgments:
+                # Already synced on every edit; metrics of unchanged matrices stay cached
+                sync_matrix_structure()
+            else:
+                # Cached metrics belong to the previous matrices
+                clear_matrix_metrics()
+                clear_pending()
+                clear_edit_log()
+                n_criteria = len(st.session_state.criteria)
+                st.session_state.criteria_matrix = np.ones((n_criteria, n_criteria))
+                
+                # Initialize alternative matrices for each criterion
+                st.session_state.alternative_matrices = {}
+                for criterion in st.session_state.criteria:
+                    n_alternatives = len(st.session_state.alternatives)
+                    st.session_state.alternative_matrices[criterion] = np.ones((n_alternatives, n_alternatives))
+                set_matrix_labels()
             
+            # A renamed analysis starts a new revision history
+            if st.session_state.get('current_session_name') != session_name.strip():
+                st.session_state.analysis_uid = uuid.uuid4().hex
             st.session_state.current_session_name = session_name.strip()
             st.session_state.current_session_description = session_description
             
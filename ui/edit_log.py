@@ -0,0 +1,163 @@
+from collections import deque
+import numpy as np
+import streamlit as st
+from ui.matrix_metrics import CRITERIA_KEY
+from ui.structure_edits import clear_editor_state
+
+# Số thao tác tối đa giữ lại cho mỗi chiều hoàn tác/làm lại
+MAX_LOG_OPERATIONS = 200
+EDIT_LOG_KEY = 'edit_log'
+
+def _new_log(undo=(), redo=()):
+    return {
+        'undo': deque(undo, maxlen=MAX_LOG_OPERATIONS),
+        'redo': deque(redo, maxlen=MAX_LOG_OPERATIONS),
+    }
+
+def _get_log():
+    if EDIT_LOG_KEY not in st.session_state:
+        st.session_state[EDIT_LOG_KEY] = _new_log()
+    return st.session_state[EDIT_LOG_KEY]
+
+def _matrix_and_labels(name):
+    """Matrix called name (CRITERIA_KEY or a criterion) and its labels, or (None, None)"""
+    if name == CRITERIA_KEY:
+        return st.session_state.criteria_matrix, st.session_state.criteria
+    matrix = st.session_state.alternative_matrices.get(name)
+    return (matrix, st.session_state.alternatives) if matrix is not None else (None, None)
+
+def record_edit(name, label_i, label_j, old, new):
+    """Log one upper-triangle judgment change of matrix name"""
+    if old != new:
+        _push(name, ((label_i, label_j, float(old), float(new)),))
+
+def record_matrix_edits(name, labels, before, after):
+    """Log every upper-triangle cell that differs between two versions of a matrix as one operation"""
+    if before.shape != after.shape:
+        return
+    rows, cols = np.triu_indices(len(labels), k=1)
+    changed = np.flatnonzero(before[rows, cols] != after[rows, cols])
+    if changed.size:
+        _push(name, tuple(
+            (labels[rows[k]], labels[cols[k]], float(before[rows[k], cols[k]]), float(after[rows[k], cols[k]]))
+            for k in changed
+        ))
+
+def _push(name, cells):
+    log = _get_log()
+    log['undo'].append((name, cells))
+    # Một thay đổi mới làm mất nhánh làm lại
+    log['redo'].clear()
+
+def _apply(name, cells, use_new):
+    """
+    Write the old (or new) value of each logged cell and its reciprocal.
+    Cells are addressed by label, so they stay valid after structural edits;
+    cells of labels that no longer exist are skipped.
+    """
+    matrix, labels = _matrix_and_labels(name)
+    if matrix is None:
+        return 0
+    position = {label: k for k, label in enumerate(labels)}
+    applied = 0
+    for label_i, label_j, old, new in cells:
+        if label_i in position and label_j in position:
+            i, j = position[label_i], position[label_j]
+            value = new if use_new else old
+            matrix[i, j] = value
+            matrix[j, i] = 1 / value
+            applied += 1
+    return applied
+
+def _move(source, target, use_new):
+    log = _get_log()
+    if not log[source]:
+        return
+    name, cells = log[source].pop()
+    _apply(name, cells, use_new)
+    log[target].append((name, cells))
+    # Bảng nhập tay giữ các ô đã sửa theo vị trí; vẽ lại từ ma trận
+    clear_editor_state()
+
+def undo_edit():
+    """Restore the old values of the most recent operation"""
+    _move('undo', 'redo', use_new=False)
+
+def redo_edit():
+    """Reapply the most recently undone operation"""
+    _move('redo', 'undo', use_new=True)
+
+def describe_operation(operation):
+    """Short text of a logged operation for button tooltips"""
+    name, cells = operation
+    matrix_title = "tiêu chí" if name == CRITERIA_KEY else name
+    if len(cells) == 1:
+        label_i, label_j, old, new = cells[0]
+        return f"{matrix_title}: {label_i} / {label_j} {old:.3g} → {new:.3g}"
+    return f"{matrix_title}: {len(cells)} ô"
+
+def rename_in_log(kind, old_name, new_name):
+    """Follow a renamed criterion or alternative so logged operations still find their cells"""
+    log = st.session_state.get(EDIT_LOG_KEY)
+    if not log:
+        return
+
+    def rename(operation):
+        name, cells = operation
+        if kind == 'criteria':
+            if name == old_name:
+                return new_name, cells
+            if name != CRITERIA_KEY:
+                return operation
+        elif name == CRITERIA_KEY:
+            return operation
+        return name, tuple(
+            (new_name if i == old_name else i, new_name if j == old_name else j, old, new)
+            for i, j, old, new in cells
+        )
+
+    for direction in ('undo', 'redo'):
+        log[direction] = deque((rename(op) for op in log[direction]), maxlen=MAX_LOG_OPERATIONS)
+
+def clear_edit_log():
+    st.session_state.pop(EDIT_LOG_KEY, None)
+
+def edit_log_to_draft(state):
+    """JSON-serializable copy of a session's log for the draft's extra data"""
+    log = state[EDIT_LOG_KEY] if EDIT_LOG_KEY in state else None
+    if not log:
+        return None
+    return {
+        direction: [[name, [list(cell) for cell in cells]] for name, cells in log[direction]]
+        for direction in ('undo', 'redo')
+    }
+
+def edit_log_from_draft(data):
+    """Restore a log saved by edit_log_to_draft"""
+    if not data:
+        clear_edit_log()
+        return
+    def operations(direction):
+        return [(name, tuple(tuple(cell) for cell in cells)) for name, cells in data.get(direction, [])]
+    st.session_state[EDIT_LOG_KEY] = _new_log(operations('undo'), operations('redo'))
+
+def show_undo_redo():
+    """Undo/redo buttons; the callbacks run before the editors render, so they show the restored values"""
+    log = _get_log()
+    col_undo, col_redo, _ = st.columns([1, 1, 4])
+    with col_undo:
+        st.button(
+            "↩️ Hoàn tác",
+            key="undo_edit",
+            on_click=undo_edit,
+            disabled=not log['undo'],
+            help=describe_operation(log['undo'][-1]) if log['undo'] else None
+        )
+    with col_redo:
+        st.button(
+            "↪️ Làm lại",
+            key="redo_edit",
+            on_click=redo_edit,
+            disabled=not log['redo'],
+            help=describe_operation(log['redo'][-1]) if log['redo'] else None
+        )
@@ -1,6 +1,21 @@
 import numpy as np
 import pandas as pd
+import io
+import json
 import logging
+import os
+import sys
+import time
+from functools import lru_cache
+from openpyxl import load_workbook
+
+try:
+    import resource
+except ImportError:  # Windows: không có getrusage, bỏ qua số liệu bộ nhớ đỉnh
+    resource = None
+
+# Tên sheet chứa ma trận tiêu chí trong workbook khảo sát (không phân biệt hoa thường)
+CRITERIA_SHEET_NAMES = ('criteria', 'tiêu chí', 'tieu chi')
 
 def validate_excel_matrix(df, expected_labels):
     """
@@ -185,6 +200,93 @@ def validate_excel_matrix(df, expected_labels):
         error_msg += f"• Sử dụng mẫu Excel được cung cấp"
         return False, error_msg, None
 
+def _rows_to_dataframe(rows):
+    """
+    Build a DataFrame shaped like pd.read_excel output from raw sheet rows:
+    the first row becomes the header, empty header cells become 'Unnamed: i'
+    """
+    if not rows:
+        return pd.DataFrame()
+    header = [
+        f"Unnamed: {i}" if value is None else str(value)
+        for i, value in enumerate(rows[0])
+    ]
+    return pd.DataFrame(rows[1:], columns=header)
+
+def _read_sheet_block(worksheet, n):
+    """
+    Read only the leading (n + 2) x (n + 1) block of a read-only worksheet.
+
+    The header row, n data rows and one spare row are enough for every slicing
+    approach tried in validate_excel_matrix; the rest of the sheet is never parsed.
+    """
+    rows = []
+    for row in worksheet.iter_rows(min_row=1, max_row=n + 2, max_col=n + 1, values_only=True):
+        rows.append(list(row) + [None] * (n + 1 - len(row)))
+    # Drop trailing blank rows so they don't count as data
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+    return _rows_to_dataframe(rows)
+
+def _peak_rss_kb():
+    """Peak resident memory of this process so far in KB, or None where getrusage is unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux báo theo KB, macOS theo byte
+    return peak / 1024 if sys.platform == 'darwin' else peak
+
+def read_excel_streaming(uploaded_file, expected_labels, sheet_names=None):
+    """
+    Stream matrices out of an Excel workbook using openpyxl's read-only mode
+
+    Args:
+        uploaded_file: Streamlit uploaded file, path or binary file object
+        expected_labels: List of expected labels (criteria or alternatives);
+            sets the size of the block read from each sheet
+        sheet_names: Sheets to read; None reads only the first sheet,
+            "all" reads every sheet in the workbook
+
+    Returns:
+        tuple: (frames, stats) where frames maps sheet name to DataFrame and
+        stats holds parse time (ms), memory of the data read (KB), sheet count
+        and, where available, the process peak memory after the parse (MB) and
+        how much this parse raised it (KB)
+    """
+    n = len(expected_labels)
+    # ru_maxrss is a cheap, lock-free read (unlike tracemalloc). It is the
+    # process-wide high-water mark, so a parse that stays under an earlier peak
+    # (of any session) raises it by 0
+    peak_before = _peak_rss_kb()
+    started = time.perf_counter()
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        if sheet_names is None:
+            worksheets = [workbook.worksheets[0]]
+        elif sheet_names == "all":
+            worksheets = workbook.worksheets
+        else:
+            worksheets = [workbook[name] for name in sheet_names]
+        frames = {ws.title: _read_sheet_block(ws, n) for ws in worksheets}
+    finally:
+        workbook.close()
+    # Stats belong to this call only; they are returned rather than kept globally
+    stats = {
+        'parse_ms': (time.perf_counter() - started) * 1000,
+        'data_kb': sum(int(df.memory_usage(deep=True).sum()) for df in frames.values()) / 1024,
+        'sheets': len(frames),
+    }
+    if peak_before is not None:
+        peak_after = _peak_rss_kb()
+        stats['peak_rss_mb'] = peak_after / 1024
+        stats['peak_growth_kb'] = peak_after - peak_before
+    logging.debug(
+        f"Streamed {stats['sheets']} sheet(s) in {stats['parse_ms']:.1f} ms, "
+        f"{stats['data_kb']:.1f} KB of data, process peak {stats.get('peak_rss_mb', 0):.1f} MB "
+        f"(+{stats.get('peak_growth_kb', 0):.0f} KB)"
+    )
+    return frames, stats
+
 def process_excel_file(uploaded_file, expected_labels):
     """
     Process an uploaded Excel file and extract the AHP matrix
@@ -194,11 +296,12 @@ def process_excel_file(uploaded_file, expected_labels):
         expected_labels: List of expected labels (criteria or alternatives)
         
     Returns:
-        tuple: (is_valid, message, processed_matrix)
+        tuple: (is_valid, message, processed_matrix, stats)
     """
     try:
-        # Read the Excel file
-        df = pd.read_excel(uploaded_file, engine='openpyxl')
+        # Stream only the expected block of the first sheet
+        frames, stats = read_excel_streaming(uploaded_file, expected_labels)
+        df = next(iter(frames.values()))
         
         logging.debug(f"Excel file shape after reading: {df.shape}")
         logging.debug(f"Expected labels: {expected_labels}")
@@ -207,45 +310,274 @@ def process_excel_file(uploaded_file, expected_labels):
         is_valid, message, matrix = validate_excel_matrix(df, expected_labels)
         logging.debug(f"validate_excel_matrix returned: is_valid={is_valid}, message={message}, matrix_shape={matrix.shape if matrix is not None else None}")
         
-        return is_valid, message, matrix
+        return is_valid, message, matrix, stats
     except Exception as e:
-        # Ensure three values are always returned
+        # Ensure four values are always returned
         logging.error(f"Error in process_excel_file: {str(e)}")
         error_msg = f"❌ **Lỗi đọc file Excel**:\n\n"
         error_msg += f"• **Chi tiết lỗi**: {str(e)}\n"
         error_msg += f"• Kiểm tra định dạng file (.xlsx)\n"
         error_msg += f"• Đảm bảo file không bị hỏng\n"
         error_msg += f"• Thử tải lại file hoặc sử dụng mẫu Excel"
-        return False, error_msg, None
+        return False, error_msg, None, {}
 
-def create_excel_template(labels, file_path):
+def process_excel_workbook(uploaded_file, criteria, alternatives):
     """
-    Create an Excel template file with the given labels
+    Process a multi-sheet survey workbook where every sheet holds one matrix.
+    
+    A sheet named after a criterion holds that criterion's alternative matrix;
+    a sheet named as in CRITERIA_SHEET_NAMES holds the criteria matrix. Other
+    sheets are skipped.
     
     Args:
-        labels: List of criteria or alternatives
-        file_path: Path to save the Excel file
+        uploaded_file: Streamlit uploaded file
+        criteria: current criteria
+        alternatives: current alternatives
+        
+    Returns:
+        tuple: (results, skipped, stats) where results maps the target matrix
+        (None for the criteria matrix, else the criterion) to
+        (sheet name, is_valid, message, processed_matrix), skipped lists the
+        unmatched sheet names and stats are as in read_excel_streaming
     """
-    # Create a DataFrame with ones on the diagonal and zeros elsewhere
+    # One pass over the workbook with a block big enough for either matrix size
+    block_labels = criteria if len(criteria) >= len(alternatives) else alternatives
+    frames, stats = read_excel_streaming(uploaded_file, block_labels, sheet_names="all")
+    
+    by_name = {str(criterion).strip().lower(): criterion for criterion in criteria}
+    results = {}
+    skipped = []
+    for sheet, df in frames.items():
+        key = sheet.strip().lower()
+        if key in CRITERIA_SHEET_NAMES:
+            results[None] = (sheet,) + validate_excel_matrix(df, criteria)
+        elif key in by_name:
+            results[by_name[key]] = (sheet,) + validate_excel_matrix(df, alternatives)
+        else:
+            skipped.append(sheet)
+    return results, skipped, stats
+
+# Tên cột cho dạng danh sách phán đoán (judgment list)
+JUDGMENT_COLUMNS = ('row', 'col', 'value')
+
+def _read_error(file_type, e):
+    """Build the standard read-error message for non-Excel uploads"""
+    error_msg = f"❌ **Lỗi đọc file {file_type}**:\n\n"
+    error_msg += f"• **Chi tiết lỗi**: {str(e)}\n"
+    error_msg += f"• Kiểm tra định dạng file ({file_type})\n"
+    error_msg += f"• Ma trận n×n có tiêu đề, hoặc danh sách cột: {', '.join(JUDGMENT_COLUMNS)}"
+    return False, error_msg, None
+
+def _is_judgment_list(columns):
+    return set(JUDGMENT_COLUMNS).issubset(str(c).strip().lower() for c in columns)
+
+def judgments_to_dataframe(rows, cols, values, expected_labels):
+    """
+    Turn a judgment list (row label, column label, value) into a matrix DataFrame
+    
+    Missing reciprocals are filled as 1/value; pairs that are never judged stay
+    empty so validate_excel_matrix reports them like empty Excel cells.
+    
+    Returns:
+        tuple: (DataFrame or None, error message)
+    """
+    labels = pd.Index([str(label) for label in expected_labels])
     n = len(labels)
-    matrix = np.ones((n, n))
+    row_idx = labels.get_indexer(pd.Index(rows).astype(str).str.strip())
+    col_idx = labels.get_indexer(pd.Index(cols).astype(str).str.strip())
+    unknown = np.flatnonzero((row_idx < 0) | (col_idx < 0))
+    if unknown.size:
+        bad = sorted({str(rows[k]) if row_idx[k] < 0 else str(cols[k]) for k in unknown[:5]})
+        error_msg = f"❌ **Nhãn không khớp**\n\n"
+        error_msg += f"• Không tìm thấy: {', '.join(bad)}\n"
+        error_msg += f"• **Yêu cầu**: {', '.join(labels)}"
+        return None, error_msg
     
-    # Set diagonal to 1 and other cells to example values for AHP
-    for i in range(n):
-        for j in range(n):
-            if i == j:
-                matrix[i, j] = 1.0  # Diagonal
-            elif i < j:
-                matrix[i, j] = 1.0  # Upper triangle (placeholder)
-            else:
-                matrix[i, j] = 1.0  # Lower triangle (placeholder)
+    values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+    matrix = np.full((n, n), np.nan)
+    matrix[row_idx, col_idx] = values
+    # Reciprocal fill for pairs given in one direction only
+    missing = np.isnan(matrix.T) & ~np.isnan(matrix)
+    with np.errstate(divide='ignore'):
+        matrix.T[missing] = 1.0 / matrix[missing]
+    np.fill_diagonal(matrix, 1.0)
+    return pd.DataFrame(matrix, columns=labels), ""
+
+def _validate_frame(df, expected_labels):
+    """Run the Excel validation rules on a matrix or judgment-list DataFrame"""
+    if df is not None and not df.empty and _is_judgment_list(df.columns):
+        df = df.rename(columns=lambda c: str(c).strip().lower())
+        df, error_msg = judgments_to_dataframe(
+            df['row'].to_numpy(), df['col'].to_numpy(), df['value'].to_numpy(), expected_labels
+        )
+        if df is None:
+            return False, error_msg, None
+    return validate_excel_matrix(df, expected_labels)
+
+def process_csv_file(uploaded_file, expected_labels):
+    """Process an uploaded CSV matrix or judgment list"""
+    try:
+        df = pd.read_csv(uploaded_file, engine='c', nrows=len(expected_labels) + 1)
+        if _is_judgment_list(df.columns):
+            # Judgment lists can be longer than n rows, read them in full
+            uploaded_file.seek(0)
+            df = pd.read_csv(uploaded_file, engine='c')
+    except Exception as e:
+        logging.error(f"Error in process_csv_file: {str(e)}")
+        return _read_error("CSV", e)
+    return _validate_frame(df, expected_labels)
+
+def _reorder_labelled_matrix(labels, matrix, expected_labels):
+    """
+    Rows and columns of a labelled matrix put in expected_labels order.
+    
+    Returns:
+        the reordered matrix (object array), or an error message when the
+        labels don't match expected_labels
+    """
+    labels = pd.Index([str(label).strip() for label in labels])
+    expected = pd.Index([str(label) for label in expected_labels])
+    matrix = np.asarray(matrix, dtype=object)
+    if labels.has_duplicates or set(labels) != set(expected):
+        error_msg = f"❌ **Nhãn không khớp**\n\n"
+        error_msg += f"• **Trong file**: {', '.join(labels)}\n"
+        error_msg += f"• **Yêu cầu**: {', '.join(expected)}"
+        return error_msg
+    if matrix.ndim != 2 or matrix.shape != (len(labels), len(labels)):
+        error_msg = f"❌ **Lỗi kích thước ma trận**\n\n"
+        error_msg += f"• **Hiện tại**: {'×'.join(map(str, matrix.shape))}\n"
+        error_msg += f"• **Yêu cầu**: {len(labels)}×{len(labels)} theo danh sách labels"
+        return error_msg
+    order = labels.get_indexer(expected)
+    return matrix[np.ix_(order, order)]
+
+def process_json_file(uploaded_file, expected_labels):
+    """
+    Process an uploaded JSON matrix or judgment list
+    
+    Accepted shapes:
+        [[...], ...]                                  - bare matrix
+        {"labels": [...], "matrix": [[...], ...]}     - labelled matrix
+        [{"row": ..., "col": ..., "value": ...}, ...] - judgment list
+        {"judgments": [...]}                          - wrapped judgment list
+    """
+    try:
+        payload = json.load(uploaded_file)
+        if isinstance(payload, dict) and 'labels' in payload and 'matrix' in payload:
+            matrix = _reorder_labelled_matrix(payload['labels'], payload['matrix'], expected_labels)
+            if isinstance(matrix, str):
+                return False, matrix, None
+            payload = matrix
+        elif isinstance(payload, dict):
+            payload = payload.get('judgments', payload.get('matrix', payload))
+        if isinstance(payload, list) and payload and isinstance(payload[0], dict):
+            df = pd.DataFrame.from_records(payload)
+        else:
+            df = pd.DataFrame(np.asarray(payload, dtype=object), columns=None)
+            df.columns = [str(label) for label in expected_labels][:df.shape[1]] + \
+                [f"Unnamed: {i}" for i in range(len(expected_labels), df.shape[1])]
+    except Exception as e:
+        logging.error(f"Error in process_json_file: {str(e)}")
+        return _read_error("JSON", e)
+    return _validate_frame(df, expected_labels)
+
+def process_parquet_file(uploaded_file, expected_labels):
+    """
+    Process an uploaded Parquet matrix or judgment list with the pyarrow
+    columnar reader; numeric columns are taken zero-copy when possible
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return False, "❌ **Thiếu thư viện pyarrow** để đọc file Parquet (pip install pyarrow)", None
+    
+    try:
+        table = pq.read_table(uploaded_file)
+        names = [str(name) for name in table.column_names]
+        
+        def column_values(name):
+            column = table.column(name).combine_chunks()
+            try:
+                return column.to_numpy(zero_copy_only=True)
+            except Exception:
+                return column.to_numpy(zero_copy_only=False)
+        
+        if _is_judgment_list(names):
+            lookup = {name.strip().lower(): name for name in names}
+            df, error_msg = judgments_to_dataframe(
+                column_values(lookup['row']),
+                column_values(lookup['col']),
+                column_values(lookup['value']),
+                expected_labels
+            )
+            if df is None:
+                return False, error_msg, None
+        else:
+            # Matrix layout: one column per label, an optional leading label column is dropped
+            value_names = [name for name in names if name in set(map(str, expected_labels))] or names
+            df = pd.DataFrame(
+                np.column_stack([column_values(name) for name in value_names]),
+                columns=value_names
+            )
+    except Exception as e:
+        logging.error(f"Error in process_parquet_file: {str(e)}")
+        return _read_error("Parquet", e)
+    return validate_excel_matrix(df, expected_labels)
+
+def process_matrix_file(uploaded_file, expected_labels):
+    """
+    Process an uploaded matrix file, dispatching on its extension
+    (.xlsx, .csv, .json, .parquet)
     
-    df = pd.DataFrame(matrix, columns=labels, index=labels)
+    Returns:
+        tuple: (is_valid, message, processed_matrix, stats) where stats holds
+        at least the parse time in ms of this upload
+    """
+    ext = os.path.splitext(getattr(uploaded_file, 'name', '') or '')[1].lower()
+    parsers = {
+        '.csv': process_csv_file,
+        '.json': process_json_file,
+        '.parquet': process_parquet_file,
+        '.pq': process_parquet_file,
+    }
+    if ext not in parsers:
+        return process_excel_file(uploaded_file, expected_labels)
+    started = time.perf_counter()
+    is_valid, message, matrix = parsers[ext](uploaded_file, expected_labels)
+    return is_valid, message, matrix, {'parse_ms': (time.perf_counter() - started) * 1000}
+
+def create_excel_template(labels, file_path=None):
+    """
+    Create an Excel template with the given labels
     
-    # Save to Excel
-    df.to_excel(file_path, index=True)
+    Args:
+        labels: List of criteria or alternatives
+        file_path: Optional path to save the Excel file; when omitted the
+            template is written to an in-memory buffer
+        
+    Returns:
+        file_path if given, otherwise the template bytes
+    """
+    # Identity matrix of ones: diagonal is 1 and every judgment starts as "equal"
+    n = len(labels)
+    df = pd.DataFrame(np.ones((n, n)), columns=list(labels), index=list(labels))
     
     # Log template creation
-    logging.debug(f"Created Excel template with {n}x{n} matrix for labels: {labels}")
+    logging.debug(f"Created Excel template with {n}x{n} matrix for labels: {list(labels)}")
+    
+    if file_path is not None:
+        df.to_excel(file_path, index=True)
+        return file_path
     
-    return file_path
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=True)
+    return buffer.getvalue()
+
+@lru_cache(maxsize=64)
+def _cached_template_bytes(labels):
+    return create_excel_template(labels)
+
+def get_excel_template_bytes(labels):
+    """Return template bytes for the labels, cached by the label tuple"""
+    return _cached_template_bytes(tuple(labels))
@@ -2,24 +2,133 @@ import streamlit as st
 import numpy as np
 import pandas as pd
 from utils.i18n import get_text
-from ahp import get_saaty_scale_description, calculate_all_results, calculate_weights, calculate_consistency_ratio
-from db import save_results
+from ahp import calculate_all_results, upper_triangle_view, complete_reciprocal
+from ui.state_adapter import save_results_async
+from ui.pairwise_editor import show_pairwise_editor
+from ui.consistency_dashboard import show_consistency_dashboard, inconsistent_matrices
+from ui.matrix_metrics import CRITERIA_KEY, get_matrix_metrics, current_fingerprints, stale_matrices
+from ui.structure_edits import sync_matrix_structure, mark_changed_answered, clear_pending, clear_editor_state
+from ui.edit_log import record_matrix_edits, show_undo_redo
+from ui.job_status import register_delivery, run_job, is_running
 from utils.formatting import format_decimal
 from utils.validation import validate_matrix_consistency
-import os
-import tempfile
 import io
 import logging
-from ui.excel_processor import process_excel_file, validate_excel_matrix, create_excel_template
+from ui.excel_processor import process_matrix_file, process_excel_workbook, validate_excel_matrix, get_excel_template_bytes
 
 logging.basicConfig(level=logging.DEBUG, filename='debug.log', filemode='w',
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
+def calculation_cells():
+    """Number of judgment cells across the criteria matrix and every alternative matrix"""
+    n_criteria = len(st.session_state.criteria)
+    n_alternatives = len(st.session_state.alternatives)
+    return n_criteria * n_criteria + n_criteria * n_alternatives * n_alternatives
+
+def show_parse_stats(stats):
+    """Parse time (and, for Excel, memory of the data read and process peak memory) of this upload"""
+    if not stats:
+        return
+    caption = f"⏱️ Đọc file: {stats['parse_ms']:.0f} ms"
+    if 'data_kb' in stats:
+        caption += f" · Dữ liệu đã đọc: {stats['data_kb']:.0f} KB"
+    if 'peak_rss_mb' in stats:
+        # Đỉnh bộ nhớ của cả tiến trình; phần tăng chỉ khác 0 khi lần đọc này vượt đỉnh cũ
+        caption += f" · Bộ nhớ đỉnh tiến trình: {stats['peak_rss_mb']:.0f} MB (+{stats['peak_growth_kb']:.0f} KB khi đọc)"
+    if stats.get('sheets', 1) > 1:
+        caption += f" · {stats['sheets']} sheet"
+    st.caption(caption)
+
+def _apply_imported_matrix(criterion, matrix):
+    """Replace the criteria matrix (criterion None) or an alternative matrix with an imported one"""
+    if criterion is None:
+        record_matrix_edits(CRITERIA_KEY, st.session_state.criteria, st.session_state.criteria_matrix, matrix)
+        st.session_state.criteria_matrix = matrix
+        clear_pending(CRITERIA_KEY)
+    else:
+        record_matrix_edits(criterion, st.session_state.alternatives, st.session_state.alternative_matrices[criterion], matrix)
+        st.session_state.alternative_matrices[criterion] = matrix
+        clear_pending(criterion)
+
+def show_workbook_import():
+    """Import a multi-sheet survey workbook: one sheet per matrix, matched by sheet name"""
+    with st.expander("📚 Nhập workbook khảo sát (nhiều sheet)"):
+        st.caption(
+            "Mỗi sheet là một ma trận: sheet tên 'Tiêu chí' (hoặc 'Criteria') cho ma trận tiêu chí, "
+            "sheet trùng tên một tiêu chí cho ma trận phương án theo tiêu chí đó."
+        )
+        uploaded_file = st.file_uploader("Upload workbook (.xlsx)", type=["xlsx"], key="survey_workbook_uploader")
+        if uploaded_file is None:
+            return
+        try:
+            results, skipped, parse_stats = process_excel_workbook(
+                uploaded_file, st.session_state.criteria, st.session_state.alternatives
+            )
+        except Exception as e:
+            logging.error(f"Error in process_excel_workbook: {str(e)}")
+            st.error(f"❌ **Lỗi đọc file Excel**: {str(e)}")
+            return
+        show_parse_stats(parse_stats)
+        
+        summary = pd.DataFrame(
+            [
+                {
+                    "Sheet": sheet,
+                    "Ma trận": get_text("criteria_comparison") if target is None else f"{get_text('alternative_comparison')} {target}",
+                    "Hợp lệ": "✅" if is_valid else "❌",
+                }
+                for target, (sheet, is_valid, _, _) in results.items()
+            ]
+        )
+        if not summary.empty:
+            st.dataframe(summary, hide_index=True, use_container_width=True)
+        if skipped:
+            st.caption(f"Bỏ qua {len(skipped)} sheet không khớp tên: {', '.join(skipped[:10])}{'…' if len(skipped) > 10 else ''}")
+        for target, (sheet, is_valid, message, _) in results.items():
+            if not is_valid:
+                st.markdown(f"**❌ Sheet '{sheet}'**")
+                st.markdown(message)
+        
+        valid = {target: matrix for target, (_, is_valid, _, matrix) in results.items() if is_valid}
+        if st.button(f"Áp dụng {len(valid)} ma trận hợp lệ", disabled=not valid, key="apply_survey_workbook"):
+            for target, matrix in valid.items():
+                _apply_imported_matrix(target, matrix)
+            # Bảng nhập tay giữ các ô đã sửa theo vị trí; vẽ lại từ ma trận mới
+            clear_editor_state()
+            st.toast(f"✅ Đã nhập {len(valid)} ma trận từ workbook", icon="✅")
+            st.rerun()
+
+@register_delivery('calculate')
+def deliver_calculation(results, context):
+    """Store calculated results in session state, save them and switch to the results tab"""
+    st.session_state.criteria_weights = results['criteria_weights']
+    st.session_state.alternative_weights = results['alternative_weights']
+    st.session_state.final_scores = results['final_scores']
+    st.session_state.consistency_ratios = results['consistency_ratios']
+    st.session_state.lambda_max_values = results['lambda_max_values']
+    st.session_state.consistency_indices = results['consistency_indices']
+    st.session_state.results_fingerprints = context['fingerprints']
+    
+    # Matrices edited while a background job ran no longer match these results, so they aren't saved
+    if not stale_matrices():
+        # Queue results for the background writer; the rerun doesn't wait on SQLite
+        save_results_async()
+    
+    # Set flag to switch to view results tab automatically
+    st.session_state.switch_to_view_results_tab = True
+
 def show_input_matrices():
     """Show the input matrices UI"""
-    if st.session_state.criteria_matrix is not None:
+    # Criteria/alternatives edited since the matrices were built: carry judgments over by label
+    sync_matrix_structure()
+    if len(st.session_state.criteria) < 2 or len(st.session_state.alternatives) < 2:
+        st.info(get_text("initialize_first"))
+    elif st.session_state.criteria_matrix is not None:
         st.header(get_text("pairwise_comparison"))
         st.info(get_text("saaty_scale_info"))
+        # Hoàn tác/làm lại từng thay đổi đánh giá, trên mọi ma trận
+        show_undo_redo()
+        show_workbook_import()
         
         # Create tabs for criteria and each alternative comparison
         tab_titles = [get_text("criteria_comparison")]
@@ -67,7 +176,6 @@ def show_input_matrices():
             )
             
             criteria_matrix = st.session_state.criteria_matrix
-            n_criteria = len(st.session_state.criteria)
             
             if input_method == "Excel Upload":
                 # Excel upload option
@@ -85,41 +193,39 @@ def show_input_matrices():
                 # Add download template button
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    # Create a temporary file
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-                        tmp_path = create_excel_template(st.session_state.criteria, tmp.name)
-                        
-                        with open(tmp_path, "rb") as f:
-                            template_bytes = f.read()
-                            st.download_button(
-                                label=get_text("excel_template"),
-                                data=template_bytes,
-                                file_name="criteria_template.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            )
-                    # Clean up the temp file
-                    if os.path.exists(tmp_path):
-                        os.unlink(tmp_path)
+                    # Template is built in memory and cached per label tuple
+                    st.download_button(
+                        label=get_text("excel_template"),
+                        data=get_excel_template_bytes(st.session_state.criteria),
+                        file_name="criteria_template.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    )
                 
                 uploaded_file = st.file_uploader(
-                    "Upload Excel file (.xlsx)", 
-                    type=["xlsx"], 
+                    "Upload matrix file (.xlsx, .csv, .json, .parquet)", 
+                    type=["xlsx", "csv", "json", "parquet"], 
                     key="criteria_excel_uploader"
                 )
                 
                 if uploaded_file is not None:
                     # Process the uploaded file
-                    is_valid, message, processed_matrix = process_excel_file(
+                    is_valid, message, processed_matrix, parse_stats = process_matrix_file(
                         uploaded_file, 
                         st.session_state.criteria
                     )
+                    show_parse_stats(parse_stats)
                     if is_valid:
                         st.success(get_text("excel_success"))
-                        criteria_matrix = processed_matrix
+                        # Apply each uploaded file once, so undoing the import isn't overwritten on the next rerun
+                        if st.session_state.get("criteria_excel_applied") != uploaded_file.file_id:
+                            st.session_state.criteria_excel_applied = uploaded_file.file_id
+                            record_matrix_edits(CRITERIA_KEY, st.session_state.criteria, criteria_matrix, processed_matrix)
+                            criteria_matrix = processed_matrix
+                            clear_pending(CRITERIA_KEY)
                         
                         # Display the processed matrix
                         matrix_df = pd.DataFrame(
-                            criteria_matrix,
+                            processed_matrix,
                             columns=st.session_state.criteria,
                             index=st.session_state.criteria
                         )
@@ -150,48 +256,16 @@ def show_input_matrices():
                             """)
             
             elif input_method == get_text("dropdown_input"):
-                # Display criteria matrix as a form with dropdowns
-                for i in range(n_criteria):
-                    for j in range(i+1, n_criteria):
-                        col1, col2, col3 = st.columns([2, 1, 2])
-                        with col1:
-                            st.write(st.session_state.criteria[i])                        
-                        with col2:
-                            def format_saaty_value(x):
-                                if x >= 1:
-                                    return f"{x} - {get_saaty_scale_description(int(x), st.session_state.language)}"
-                                else:
-                                    inv_val = int(1/x)
-                                    return f"1/{inv_val} - {get_text('inverse_of')} {get_saaty_scale_description(inv_val, st.session_state.language)}"
-                            
-                            value = st.selectbox(
-                                f"{get_text('compare')} {st.session_state.criteria[i]} {get_text('vs')} {st.session_state.criteria[j]}",
-                                options=[1, 2, 3, 4, 5, 6, 7, 8, 9, 1/2, 1/3, 1/4, 1/5, 1/6, 1/7, 1/8, 1/9],
-                                format_func=format_saaty_value,
-                                key=f"criteria_{i}_{j}",
-                                index=0
-                            )
-                            criteria_matrix[i, j] = value
-                            criteria_matrix[j, i] = 1 / value
-                        with col3:
-                            st.write(st.session_state.criteria[j])
+                # Paged dropdown editor: widgets only for the visible pairs
+                show_pairwise_editor(st.session_state.criteria)
             else:  # Manual input
-                # Create a DataFrame for manual input
+                # Create a DataFrame for manual input: diagonal 1, upper triangle from the matrix
                 matrix_df = pd.DataFrame(
-                    data=np.zeros((n_criteria, n_criteria)),
+                    data=upper_triangle_view(criteria_matrix),
                     columns=st.session_state.criteria,
                     index=st.session_state.criteria
                 )
                 
-                # Fill the diagonal with 1s
-                for i in range(n_criteria):
-                    matrix_df.iloc[i, i] = 1.0
-                
-                # Fill the upper triangle with current values
-                for i in range(n_criteria):
-                    for j in range(i+1, n_criteria):
-                        matrix_df.iloc[i, j] = criteria_matrix[i, j]
-                
                 # Create an editable dataframe
                 st.write("Enter values in the upper triangle only. Lower triangle will be calculated automatically.")
                 
@@ -201,27 +275,27 @@ def show_input_matrices():
                     key="criteria_matrix_editor"
                 )
                 
-                # Update the criteria matrix with edited values, but only from the upper triangle
-                for i in range(n_criteria):
-                    for j in range(i+1, n_criteria):
-                        value = edited_matrix_df.iloc[i, j]
-                        criteria_matrix[i, j] = value
-                        criteria_matrix[j, i] = 1 / value
+                # Update the criteria matrix from the upper triangle; blank or non-positive cells keep their previous value
+                edited_values = edited_matrix_df.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+                completed, n_invalid = complete_reciprocal(edited_values, previous=criteria_matrix)
+                mark_changed_answered(CRITERIA_KEY, st.session_state.criteria, criteria_matrix, completed)
+                record_matrix_edits(CRITERIA_KEY, st.session_state.criteria, criteria_matrix, completed)
+                criteria_matrix[:, :] = completed
+                if n_invalid:
+                    st.warning(f"{n_invalid} ô trống hoặc không hợp lệ (≤ 0) được giữ giá trị trước đó.")
                 
                 # Display the complete matrix with lower triangle calculated
-                complete_matrix = edited_matrix_df.copy()
-                for i in range(n_criteria):
-                    for j in range(i):
-                        complete_matrix.iloc[i, j] = 1 / complete_matrix.iloc[j, i] if complete_matrix.iloc[j, i] != 0 else 0
+                complete_matrix = pd.DataFrame(completed, columns=edited_matrix_df.columns, index=edited_matrix_df.index)
                 
                 st.write("Complete matrix with calculated lower triangle:")
                 st.dataframe(complete_matrix)
             
             st.session_state.criteria_matrix = criteria_matrix
             
-            # Calculate and display weights and consistency ratio
-            criteria_weights = calculate_weights(criteria_matrix)
-            cr_criteria, lambda_max_criteria, ci_criteria = calculate_consistency_ratio(criteria_matrix, criteria_weights)
+            # Weights and consistency ratio, recomputed only when the matrix changed
+            metrics = get_matrix_metrics(CRITERIA_KEY, criteria_matrix)
+            criteria_weights = metrics['weights']
+            cr_criteria, lambda_max_criteria, ci_criteria = metrics['cr'], metrics['lambda_max'], metrics['ci']
             
             # Create a DataFrame for criteria weights
             weights_df = pd.DataFrame({
@@ -249,23 +323,6 @@ def show_input_matrices():
                 else:
                     st.error(message)
             
-            # Store the calculated values in session state
-            if 'temp_criteria_weights' not in st.session_state:
-                st.session_state.temp_criteria_weights = {}
-            st.session_state.temp_criteria_weights['criteria'] = criteria_weights
-            
-            if 'temp_consistency_ratios' not in st.session_state:
-                st.session_state.temp_consistency_ratios = {}
-            st.session_state.temp_consistency_ratios['criteria'] = cr_criteria
-            
-            if 'temp_lambda_max_values' not in st.session_state:
-                st.session_state.temp_lambda_max_values = {}
-            st.session_state.temp_lambda_max_values['criteria'] = lambda_max_criteria
-            
-            if 'temp_consistency_indices' not in st.session_state:
-                st.session_state.temp_consistency_indices = {}
-            st.session_state.temp_consistency_indices['criteria'] = ci_criteria
-            
             # Track consistency status and provide navigation
             valid_consistency, _ = validate_matrix_consistency(cr_criteria)
             st.session_state.matrix_consistency['criteria'] = valid_consistency
@@ -291,7 +348,6 @@ def show_input_matrices():
             )
             
             alternative_matrix = st.session_state.alternative_matrices[criterion]
-            n_alternatives = len(st.session_state.alternatives)
             
             if input_method == "Excel Upload":
                 # Excel upload option
@@ -309,42 +365,40 @@ def show_input_matrices():
                 # Add download template button
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    # Create a temporary file
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-                        tmp_path = create_excel_template(st.session_state.alternatives, tmp.name)
-                        
-                        with open(tmp_path, "rb") as f:
-                            template_bytes = f.read()
-                            st.download_button(
-                                label="Download Excel Template",
-                                data=template_bytes,
-                                file_name=f"alternatives_{criterion}_template.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            )
-                    # Clean up the temp file
-                    if os.path.exists(tmp_path):
-                        os.unlink(tmp_path)
+                    # Template is built in memory and cached per label tuple
+                    st.download_button(
+                        label="Download Excel Template",
+                        data=get_excel_template_bytes(st.session_state.alternatives),
+                        file_name=f"alternatives_{criterion}_template.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    )
                 
                 uploaded_file = st.file_uploader(
-                    "Upload Excel file (.xlsx)", 
-                    type=["xlsx"], 
+                    "Upload matrix file (.xlsx, .csv, .json, .parquet)", 
+                    type=["xlsx", "csv", "json", "parquet"], 
                     key=f"alt_excel_uploader_{criterion_idx}"
                 )
                 
                 if uploaded_file is not None:
                     # Process the uploaded file
-                    is_valid, message, processed_matrix = process_excel_file(
+                    is_valid, message, processed_matrix, parse_stats = process_matrix_file(
                         uploaded_file, 
                         st.session_state.alternatives
                     )
+                    show_parse_stats(parse_stats)
                     
                     if is_valid:
                         st.success(get_text("excel_success"))
-                        alternative_matrix = processed_matrix
+                        applied_key = f"alt_excel_applied_{criterion_idx}"
+                        if st.session_state.get(applied_key) != uploaded_file.file_id:
+                            st.session_state[applied_key] = uploaded_file.file_id
+                            record_matrix_edits(criterion, st.session_state.alternatives, alternative_matrix, processed_matrix)
+                            alternative_matrix = processed_matrix
+                            clear_pending(criterion)
                         
                         # Display the processed matrix
                         matrix_df = pd.DataFrame(
-                            alternative_matrix,
+                            processed_matrix,
                             columns=st.session_state.alternatives,
                             index=st.session_state.alternatives
                         )
@@ -371,49 +425,16 @@ def show_input_matrices():
                             """)
                 
             elif input_method == get_text("dropdown_input"):
-                # Display alternative matrix as a form with dropdowns
-                for i in range(n_alternatives):
-                    for j in range(i+1, n_alternatives):
-                        col1, col2, col3 = st.columns([2, 1, 2])
-                        with col1:
-                            st.write(st.session_state.alternatives[i])
-                        with col2:
-                            def format_saaty_value_alt(x):
-                                if x >= 1:
-                                    return f"{x} - {get_saaty_scale_description(int(x), st.session_state.language)}"
-                                else:
-                                    inv_val = int(1/x)
-                                    return f"1/{inv_val} - {get_text('inverse_of')} {get_saaty_scale_description(inv_val, st.session_state.language)}"
-                            
-                            value = st.selectbox(
-                                f"{get_text('compare')} {st.session_state.alternatives[i]} {get_text('vs')} {st.session_state.alternatives[j]} {get_text('for')} {criterion}",
-                                options=[1, 2, 3, 4, 5, 6, 7, 8, 9, 1/2, 1/3, 1/4, 1/5, 1/6, 1/7, 1/8, 1/9],
-                                format_func=format_saaty_value_alt,
-
-                                key=f"alt_{criterion_idx}_{i}_{j}",
-                                index=0
-                            )
-                            alternative_matrix[i, j] = value
-                            alternative_matrix[j, i] = 1 / value
-                        with col3:
-                            st.write(st.session_state.alternatives[j])
+                # Paged dropdown editor: widgets only for the visible pairs
+                show_pairwise_editor(st.session_state.alternatives, criterion)
             else:  # Manual input
-                # Create a DataFrame for manual input
+                # Create a DataFrame for manual input: diagonal 1, upper triangle from the matrix
                 matrix_df = pd.DataFrame(
-                    data=np.zeros((n_alternatives, n_alternatives)),
+                    data=upper_triangle_view(alternative_matrix),
                     columns=st.session_state.alternatives,
                     index=st.session_state.alternatives
                 )
                 
-                # Fill the diagonal with 1s
-                for i in range(n_alternatives):
-                    matrix_df.iloc[i, i] = 1.0
-                
-                # Fill the upper triangle with current values
-                for i in range(n_alternatives):
-                    for j in range(i+1, n_alternatives):
-                        matrix_df.iloc[i, j] = alternative_matrix[i, j]
-                
                 # Create an editable dataframe
                 st.write("Enter values in the upper triangle only. Lower triangle will be calculated automatically.")
                 
@@ -423,18 +444,17 @@ def show_input_matrices():
                     key=f"alt_matrix_editor_{criterion_idx}"
                 )
                 
-                # Update the alternative matrix with edited values, but only from the upper triangle
-                for i in range(n_alternatives):
-                    for j in range(i+1, n_alternatives):
-                        value = edited_matrix_df.iloc[i, j]
-                        alternative_matrix[i, j] = value
-                        alternative_matrix[j, i] = 1 / value
+                # Update the alternative matrix from the upper triangle; blank or non-positive cells keep their previous value
+                edited_values = edited_matrix_df.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+                completed, n_invalid = complete_reciprocal(edited_values, previous=alternative_matrix)
+                mark_changed_answered(criterion, st.session_state.alternatives, alternative_matrix, completed)
+                record_matrix_edits(criterion, st.session_state.alternatives, alternative_matrix, completed)
+                alternative_matrix[:, :] = completed
+                if n_invalid:
+                    st.warning(f"{n_invalid} ô trống hoặc không hợp lệ (≤ 0) được giữ giá trị trước đó.")
                 
                 # Display the complete matrix with lower triangle calculated
-                complete_matrix = edited_matrix_df.copy()
-                for i in range(n_alternatives):
-                    for j in range(i):
-                        complete_matrix.iloc[i, j] = 1 / complete_matrix.iloc[j, i] if complete_matrix.iloc[j, i] != 0 else 0
+                complete_matrix = pd.DataFrame(completed, columns=edited_matrix_df.columns, index=edited_matrix_df.index)
                 
                 st.write("Complete matrix with calculated lower triangle:")
                 st.dataframe(complete_matrix)
@@ -442,8 +462,9 @@ def show_input_matrices():
             st.session_state.alternative_matrices[criterion] = alternative_matrix
             
             # Calculate and display weights and consistency metrics
-            alt_weights = calculate_weights(alternative_matrix)
-            cr_alt, lambda_max_alt, ci_alt = calculate_consistency_ratio(alternative_matrix, alt_weights)
+            metrics = get_matrix_metrics(criterion, alternative_matrix)
+            alt_weights = metrics['weights']
+            cr_alt, lambda_max_alt, ci_alt = metrics['cr'], metrics['lambda_max'], metrics['ci']
             
             # Create a DataFrame for alternative weights
             weights_df = pd.DataFrame({
@@ -471,23 +492,6 @@ def show_input_matrices():
                 else:
                     st.error(message)
             
-            # Store the calculated values in session state
-            if 'temp_alternative_weights' not in st.session_state:
-                st.session_state.temp_alternative_weights = {}
-            st.session_state.temp_alternative_weights[criterion] = alt_weights
-            
-            if 'temp_consistency_ratios' not in st.session_state:
-                st.session_state.temp_consistency_ratios = {}
-            st.session_state.temp_consistency_ratios[criterion] = cr_alt
-            
-            if 'temp_lambda_max_values' not in st.session_state:
-                st.session_state.temp_lambda_max_values = {}
-            st.session_state.temp_lambda_max_values[criterion] = lambda_max_alt
-            
-            if 'temp_consistency_indices' not in st.session_state:
-                st.session_state.temp_consistency_indices = {}
-            st.session_state.temp_consistency_indices[criterion] = ci_alt
-            
             # Track consistency status and provide navigation
             valid_consistency, _ = validate_matrix_consistency(cr_alt)
             st.session_state.matrix_consistency[criterion] = valid_consistency
@@ -521,70 +525,31 @@ def show_input_matrices():
         
         # Calculate results button - show at the bottom of every tab
         st.markdown("---")
-        if st.button(get_text("calculate_results"), type="primary"):
-            # Check consistency ratios for all matrices
-            all_consistent = True
-            inconsistent_matrices = []
-            
-            # Check criteria matrix
-            if 'matrix_consistency' in st.session_state and 'criteria' in st.session_state.matrix_consistency:
-                valid_criteria = st.session_state.matrix_consistency['criteria']
-                if not valid_criteria:
-                    all_consistent = False
-                    inconsistent_matrices.append(get_text("criteria_comparison"))
-            else:
-                # Fallback to direct calculation if matrix_consistency not set
-                if 'temp_consistency_ratios' in st.session_state and 'criteria' in st.session_state.temp_consistency_ratios:
-                    cr_criteria = st.session_state.temp_consistency_ratios['criteria']
-                    valid_criteria, _ = validate_matrix_consistency(cr_criteria)
-                    if not valid_criteria:
-                        all_consistent = False
-                        inconsistent_matrices.append(get_text("criteria_comparison"))
-                        all_consistent = False
-                        inconsistent_matrices.append(get_text("criteria_comparison"))
-
-            
-            # Check alternative matrices for each criterion
-            for criterion in st.session_state.criteria:
-                if 'matrix_consistency' in st.session_state and criterion in st.session_state.matrix_consistency:
-                    valid_alt = st.session_state.matrix_consistency[criterion]
-                    if not valid_alt:
-                        all_consistent = False
-                        inconsistent_matrices.append(f"{get_text('alternative_comparison')} {criterion}")
-                elif ('temp_consistency_ratios' in st.session_state and 
-                      criterion in st.session_state.temp_consistency_ratios):
-                    cr_alt = st.session_state.temp_consistency_ratios[criterion]
-                    valid_alt, _ = validate_matrix_consistency(cr_alt)
-                    if not valid_alt:
-                        all_consistent = False
-                        inconsistent_matrices.append(f"{get_text('alternative_comparison')} {criterion}")
+        # CR of every matrix at once (after this run's edits), with the cells that contribute most to inconsistency
+        show_consistency_dashboard()
+        stale = stale_matrices()
+        if stale:
+            st.info(f"🔄 Kết quả hiện tại đã cũ: {len(stale)} ma trận đã thay đổi kể từ lần tính gần nhất.")
+        if st.button(get_text("calculate_results"), type="primary", disabled=is_running('calculate')):
+            # Check consistency ratios for all matrices, visited or not (one batch, cached per matrix)
+            inconsistent = inconsistent_matrices()
+            all_consistent = not inconsistent
             
             if all_consistent:
-                # Calculate all results
-                results = calculate_all_results(
-                    st.session_state.criteria_matrix,
-                    st.session_state.alternative_matrices,
-                    st.session_state.criteria,
-                    st.session_state.alternatives
+                args = (
+                    st.session_state.criteria_matrix.copy(),
+                    {c: m.copy() for c, m in st.session_state.alternative_matrices.items()},
+                    list(st.session_state.criteria),
+                    list(st.session_state.alternatives)
                 )
-                
-                # Store results in session state
-                st.session_state.criteria_weights = results['criteria_weights']
-                st.session_state.alternative_weights = results['alternative_weights']
-                st.session_state.final_scores = results['final_scores']
-                st.session_state.consistency_ratios = results['consistency_ratios']
-                st.session_state.lambda_max_values = results['lambda_max_values']
-                st.session_state.consistency_indices = results['consistency_indices']
-                
-                # Save results to database
-                save_results()
-                
-                # Set flag to switch to view results tab automatically
-                st.session_state.switch_to_view_results_tab = True
-                st.rerun()
+                context = {'fingerprints': current_fingerprints()}
+                # Inline unless the measured cost of this many cells exceeds the budget
+                if run_job('calculate', 'calculate', [(calculate_all_results, args)], context,
+                           units=calculation_cells()):
+                    st.rerun()
             else:
                 # Show error message with inconsistent matrices
-                error_msg = get_text("error_consistency_ratio") + "\n" + ", ".join(inconsistent_matrices)
+                error_msg = get_text("error_consistency_ratio") + "\n" + ", ".join(inconsistent)
                 st.error(error_msg)
     else:
         st.info(get_text("initialize_first"))
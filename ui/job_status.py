@@ -0,0 +1,121 @@
+import time
+import logging
+import streamlit as st
+from jobs import submit_job, get_job, collect_job
+
+# Nhãn hiển thị của từng loại tác vụ nền
+JOB_LABELS = {
+    'calculate': "Đang tính toán kết quả",
+    'report': "Đang tạo file xuất",
+}
+POLL_INTERVAL_SECONDS = 1.0
+# Công việc ước tính xong trong thời gian này chạy ngay trong lượt chạy hiện tại,
+# tránh vòng gửi tiến trình nền và chờ thăm dò mỗi giây
+INLINE_BUDGET_SECONDS = 0.3
+
+_deliveries = {}
+# Thời gian đo được cho mỗi đơn vị công việc của từng loại, từ các lần chạy trực tiếp
+_cost_per_unit = {}
+
+def register_delivery(kind):
+    """Decorator registering fn(result, context) to receive results of a job kind"""
+    def decorator(fn):
+        _deliveries[kind] = fn
+        return fn
+    return decorator
+
+def start_job(slot, kind, tasks, context=None, combine=None):
+    """
+    Submit a job for this browser session, replacing any job in the same slot.
+
+    Args:
+        slot: session-unique name, e.g. 'calculate' or 'report_12'
+        kind: job kind, selects the registered delivery function
+        tasks: list of (function, args) run in the worker pool
+        context: data kept in this process and handed to the delivery function
+    """
+    jobs = st.session_state.setdefault('jobs', {})
+    previous = jobs.get(slot)
+    if previous is not None:
+        handle = collect_job(previous['job_id'])
+        if handle is not None:
+            handle.cancel()
+    handle = submit_job(kind, tasks, combine)
+    jobs[slot] = {'job_id': handle.job_id, 'kind': kind, 'context': context or {}}
+    return handle
+
+def estimated_seconds(kind, units):
+    """Expected inline run time of a job kind for this much work (0 until first measured)"""
+    return _cost_per_unit.get(kind, 0.0) * units
+
+def run_job(slot, kind, tasks, context=None, combine=None, units=1):
+    """
+    Run a job inline if its measured cost fits INLINE_BUDGET_SECONDS,
+    otherwise submit it like start_job.
+
+    Inline runs hand their result straight to the delivery function and
+    update the per-unit cost of the kind, so the split follows how long the
+    work actually takes on this server.
+
+    Args:
+        units: size of the work (any measure proportional to its cost,
+            consistent within a kind)
+
+    Returns:
+        the JobHandle when submitted, True when delivered inline, False when
+        the inline run failed (the error is shown)
+    """
+    units = max(units, 1)
+    if estimated_seconds(kind, units) > INLINE_BUDGET_SECONDS:
+        return start_job(slot, kind, tasks, context, combine)
+    start = time.perf_counter()
+    try:
+        results = [fn(*args) for fn, args in tasks]
+        result = combine(results) if combine else (results[0] if len(results) == 1 else results)
+    except Exception as e:
+        logging.error(f"Inline {kind} job failed: {e}")
+        st.error(f"❌ {JOB_LABELS.get(kind, kind)} thất bại: {e}")
+        return False
+    measured = (time.perf_counter() - start) / units
+    previous = _cost_per_unit.get(kind)
+    _cost_per_unit[kind] = measured if previous is None else (previous + measured) / 2
+    _deliveries[kind](result, context or {})
+    return True
+
+def is_running(slot):
+    return slot in st.session_state.get('jobs', {})
+
+def deliver_finished_jobs():
+    """Hand results of finished jobs to their delivery functions (in the script thread)"""
+    jobs = st.session_state.get('jobs', {})
+    for slot, job in list(jobs.items()):
+        handle = get_job(job['job_id'])
+        if handle is None:
+            del jobs[slot]
+            st.warning(f"⚠️ Tác vụ nền '{JOB_LABELS.get(job['kind'], job['kind'])}' không còn tồn tại, vui lòng thử lại.")
+            continue
+        if not handle.done():
+            continue
+        collect_job(job['job_id'])
+        del jobs[slot]
+        error = handle.exception()
+        if error is not None:
+            st.error(f"❌ {JOB_LABELS.get(job['kind'], job['kind'])} thất bại: {error}")
+            continue
+        _deliveries[job['kind']](handle.result(), job['context'])
+
+@st.fragment(run_every=POLL_INTERVAL_SECONDS)
+def _job_progress():
+    jobs = st.session_state.get('jobs', {})
+    handles = [(job, get_job(job['job_id'])) for job in jobs.values()]
+    # A finished job triggers a full rerun, which delivers it before the page renders
+    if any(handle is None or handle.done() for _, handle in handles):
+        st.rerun()
+    for job, handle in handles:
+        st.progress(handle.progress(), text=JOB_LABELS.get(job['kind'], job['kind']))
+
+def show_job_progress():
+    """Sidebar progress of this session's running jobs, polled until they finish"""
+    if st.session_state.get('jobs'):
+        with st.sidebar:
+            _job_progress()
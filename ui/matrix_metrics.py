@@ -0,0 +1,97 @@
+import hashlib
+import numpy as np
+import streamlit as st
+from ahp import batch_consistency
+
+# Tên dùng cho ma trận tiêu chí trong bộ nhớ đệm (ma trận phương án dùng tên tiêu chí)
+CRITERIA_KEY = 'criteria'
+
+def matrix_fingerprint(matrix):
+    """Content fingerprint of a matrix (shape and values)"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+    digest = hashlib.blake2b(repr(matrix.shape).encode(), digest_size=16)
+    digest.update(matrix.tobytes())
+    return digest.hexdigest()
+
+def _update_metrics(cache, changed):
+    """Compute metrics for [(name, fingerprint, matrix)], batching same-sized matrices"""
+    by_size = {}
+    for item in changed:
+        by_size.setdefault(np.shape(item[2]), []).append(item)
+    for group in by_size.values():
+        metrics = batch_consistency(np.stack([matrix for _, _, matrix in group]))
+        for k, (name, fingerprint, _) in enumerate(group):
+            cache[name] = {
+                'fingerprint': fingerprint,
+                'weights': metrics['weights'][k],
+                'cr': float(metrics['cr'][k]),
+                'lambda_max': float(metrics['lambda_max'][k]),
+                'ci': float(metrics['ci'][k]),
+                'worst_cells': metrics['worst_cells'][k],
+            }
+
+def get_matrix_metrics(name, matrix):
+    """
+    Weights and consistency metrics of one matrix, recomputed only when its
+    content changed since the last call for the same name
+
+    Returns:
+        dict with fingerprint, weights, cr, lambda_max, ci and worst_cells
+    """
+    cache = st.session_state.setdefault('matrix_metrics', {})
+    fingerprint = matrix_fingerprint(matrix)
+    cached = cache.get(name)
+    if cached is None or cached['fingerprint'] != fingerprint:
+        _update_metrics(cache, [(name, fingerprint, matrix)])
+    return cache[name]
+
+def get_all_metrics():
+    """
+    Metrics of the criteria matrix and every alternative matrix; only matrices
+    changed since the last call are recomputed, in one batch per matrix size
+
+    Returns:
+        dict of name (CRITERIA_KEY or criterion) -> metrics as in get_matrix_metrics
+    """
+    cache = st.session_state.setdefault('matrix_metrics', {})
+    matrices = {CRITERIA_KEY: st.session_state.criteria_matrix}
+    for criterion in st.session_state.criteria:
+        matrices[criterion] = st.session_state.alternative_matrices[criterion]
+
+    changed = []
+    for name, matrix in matrices.items():
+        fingerprint = matrix_fingerprint(matrix)
+        cached = cache.get(name)
+        if cached is None or cached['fingerprint'] != fingerprint:
+            changed.append((name, fingerprint, matrix))
+    if changed:
+        _update_metrics(cache, changed)
+    return {name: cache[name] for name in matrices}
+
+def current_fingerprints():
+    """Fingerprint of every matrix of the analysis, keyed like the metrics cache"""
+    fingerprints = {CRITERIA_KEY: matrix_fingerprint(st.session_state.criteria_matrix)}
+    for criterion in st.session_state.criteria:
+        fingerprints[criterion] = matrix_fingerprint(st.session_state.alternative_matrices[criterion])
+    return fingerprints
+
+def stale_matrices():
+    """
+    Matrices edited since the results were calculated
+
+    Returns:
+        list of matrix names (CRITERIA_KEY or criterion names); empty when the
+        results are current or there are no results
+    """
+    calculated = st.session_state.get('results_fingerprints')
+    if not calculated or st.session_state.criteria_matrix is None:
+        return []
+    current = current_fingerprints()
+    if set(current) != set(calculated):
+        return list(current)
+    return [name for name, fingerprint in current.items() if calculated[name] != fingerprint]
+
+def clear_matrix_metrics():
+    """Drop cached metrics and result fingerprints, e.g. when matrices are re-initialized"""
+    st.session_state.pop('matrix_metrics', None)
+    st.session_state.pop('results_fingerprints', None)
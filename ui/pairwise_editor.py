@@ -0,0 +1,133 @@
+import math
+from functools import lru_cache
+import numpy as np
+import streamlit as st
+from utils.i18n import get_text, get_language
+from ahp import get_saaty_scale_description
+from ui.matrix_metrics import CRITERIA_KEY
+from ui.structure_edits import get_pending_pairs, mark_pair_answered
+from ui.edit_log import record_edit
+
+# Thang Saaty theo thứ tự hiển thị trong hộp chọn
+SAATY_OPTIONS = (1, 2, 3, 4, 5, 6, 7, 8, 9, 1/2, 1/3, 1/4, 1/5, 1/6, 1/7, 1/8, 1/9)
+_LOG_OPTIONS = tuple(math.log(x) for x in SAATY_OPTIONS)
+# Số cặp so sánh hiển thị trên mỗi trang
+PAIRS_PER_PAGE = 12
+ALL_LABELS = "__all__"
+PENDING_ONLY = "__pending__"
+
+@lru_cache(maxsize=None)
+def option_labels(language):
+    """Display labels of SAATY_OPTIONS, built once per language"""
+    labels = []
+    for x in SAATY_OPTIONS:
+        if x >= 1:
+            labels.append(f"{x} - {get_saaty_scale_description(int(x), language)}")
+        else:
+            inv_val = int(round(1 / x))
+            labels.append(f"1/{inv_val} - {get_text('inverse_of', language)} {get_saaty_scale_description(inv_val, language)}")
+    return tuple(labels)
+
+def nearest_option(value):
+    """Index of the Saaty option closest to value on the log scale"""
+    if not math.isfinite(value) or value <= 0:
+        return 0
+    log_value = math.log(value)
+    return min(range(len(SAATY_OPTIONS)), key=lambda k: abs(_LOG_OPTIONS[k] - log_value))
+
+def _get_matrix(criterion):
+    """Criteria matrix when criterion is None, otherwise that criterion's alternative matrix"""
+    if criterion is None:
+        return st.session_state.criteria_matrix
+    return st.session_state.alternative_matrices[criterion]
+
+def _pair_key(prefix, label_i, label_j):
+    # Khóa theo tên nhãn để giá trị không bị lệch khi thêm/xóa/sắp xếp lại
+    return f"pw_{prefix}_{label_i}\x1f{label_j}"
+
+def _on_pair_change(criterion, i, j, widget_key, label_i, label_j):
+    """Write the chosen judgment and its reciprocal into the matrix"""
+    value = SAATY_OPTIONS[st.session_state[widget_key]]
+    matrix = _get_matrix(criterion)
+    record_edit(CRITERIA_KEY if criterion is None else criterion, label_i, label_j, matrix[i, j], value)
+    matrix[i, j] = value
+    matrix[j, i] = 1 / value
+    mark_pair_answered(CRITERIA_KEY if criterion is None else criterion, label_i, label_j)
+
+def show_pairwise_editor(labels, criterion=None):
+    """
+    Paged dropdown editor for the upper triangle of a pairwise matrix.
+
+    Only the pairs on the current page get widgets. Each widget writes into the
+    matrix through its on_change callback, and is re-synced from the matrix
+    before rendering so values entered through other input methods show up.
+
+    Args:
+        labels: row/column labels of the matrix
+        criterion: None for the criteria matrix, else the criterion whose
+            alternative matrix is edited
+    """
+    prefix = "criteria" if criterion is None else f"alt_{criterion}"
+    matrix = _get_matrix(criterion)
+    n = len(labels)
+    language = get_language()
+    labels_for_options = option_labels(language)
+
+    # Lọc theo một nhãn để đi thẳng tới các cặp liên quan, hoặc chỉ các cặp mới chưa đánh giá
+    pending = get_pending_pairs(CRITERIA_KEY if criterion is None else criterion)
+    focus_options = ((PENDING_ONLY,) if pending else ()) + (ALL_LABELS,) + tuple(labels)
+    focus_key = f"pw_{prefix}_focus"
+    if st.session_state.get(focus_key) not in focus_options:
+        st.session_state[focus_key] = focus_options[0]
+    focus_names = {PENDING_ONLY: f"Cặp mới chưa đánh giá ({len(pending)})", ALL_LABELS: "Tất cả các cặp"}
+    focus = st.selectbox(
+        "Lọc theo",
+        focus_options,
+        format_func=lambda x: focus_names.get(x, x),
+        key=focus_key
+    )
+    if focus == PENDING_ONLY:
+        position = {label: k for k, label in enumerate(labels)}
+        pairs = sorted((position[a], position[b]) for a, b in pending)
+    elif focus == ALL_LABELS:
+        pairs = [(i, j) for i in range(n) for j in range(i + 1, n)]
+    else:
+        k = labels.index(focus)
+        pairs = [(min(k, j), max(k, j)) for j in range(n) if j != k]
+
+    n_pages = max(1, math.ceil(len(pairs) / PAIRS_PER_PAGE))
+    page_key = f"pw_{prefix}_page"
+    if st.session_state.get(page_key, 1) > n_pages:
+        st.session_state[page_key] = 1
+    if n_pages > 1:
+        page = st.number_input(f"Trang (1–{n_pages})", min_value=1, max_value=n_pages, step=1, key=page_key)
+    else:
+        page = 1
+
+    answered = int((matrix[np.triu_indices(n, 1)] != 1).sum()) if n > 1 else 0
+    pending_note = f" · cặp mới chưa đánh giá: {len(pending)}" if pending else ""
+    st.caption(f"{len(pairs)} cặp · đã khác 1: {answered}/{n * (n - 1) // 2}{pending_note}")
+
+    for i, j in pairs[(page - 1) * PAIRS_PER_PAGE:page * PAIRS_PER_PAGE]:
+        widget_key = _pair_key(prefix, labels[i], labels[j])
+        synced = nearest_option(float(matrix[i, j]))
+        if st.session_state.get(widget_key) != synced:
+            st.session_state[widget_key] = synced
+
+        col1, col2, col3 = st.columns([2, 1, 2])
+        with col1:
+            st.write(labels[i])
+        with col2:
+            question = f"{get_text('compare')} {labels[i]} {get_text('vs')} {labels[j]}"
+            if criterion is not None:
+                question += f" {get_text('for')} {criterion}"
+            st.selectbox(
+                question,
+                range(len(SAATY_OPTIONS)),
+                format_func=labels_for_options.__getitem__,
+                key=widget_key,
+                on_change=_on_pair_change,
+                args=(criterion, i, j, widget_key, labels[i], labels[j])
+            )
+        with col3:
+            st.write(labels[j])
@@ -0,0 +1,157 @@
+import uuid
+import hashlib
+from datetime import datetime
+import numpy as np
+import streamlit as st
+from db import save_analysis, load_draft, delete_draft
+from db_writer import save_analysis_async, save_draft_async, cancel_draft
+from ui.structure_edits import set_matrix_labels
+from ui.edit_log import edit_log_to_draft, edit_log_from_draft
+
+# Khóa bản nháp nằm trên URL để tải lại trang vẫn tìm được bản nháp
+DRAFT_QUERY_PARAM = "draft"
+
+def current_result():
+    """
+    Copy the current analysis out of session state into a plain result dict,
+    the form accepted by db.save_analysis and the export functions
+    """
+    return {
+        'name': st.session_state.current_session_name,
+        'description': st.session_state.current_session_description,
+        'criteria': list(st.session_state.criteria),
+        'alternatives': list(st.session_state.alternatives),
+        'criteria_matrix': np.array(st.session_state.criteria_matrix, dtype=np.float64),
+        'alternative_matrices': {k: np.array(v, dtype=np.float64) for k, v in st.session_state.alternative_matrices.items()},
+        'criteria_weights': np.array(st.session_state.criteria_weights, dtype=np.float64),
+        'alternative_weights': {k: np.array(v, dtype=np.float64) for k, v in st.session_state.alternative_weights.items()},
+        'final_scores': np.array(st.session_state.final_scores, dtype=np.float64),
+        'consistency_ratios': dict(st.session_state.consistency_ratios),
+        'lambda_max_values': dict(st.session_state.lambda_max_values) if hasattr(st.session_state, 'lambda_max_values') else None,
+        'consistency_indices': dict(st.session_state.consistency_indices) if hasattr(st.session_state, 'consistency_indices') else None,
+        'analysis_uid': get_analysis_uid(),
+    }
+
+def get_analysis_uid():
+    """Stable id of the analysis being edited in this browser session"""
+    if 'analysis_uid' not in st.session_state:
+        st.session_state.analysis_uid = uuid.uuid4().hex
+    return st.session_state.analysis_uid
+
+def _result_to_save():
+    result = current_result()
+    result['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return result
+
+def save_results():
+    """Save the current results synchronously; returns the new session id"""
+    return save_analysis(_result_to_save())
+
+def save_results_async():
+    """Queue the current results for the background writer"""
+    save_analysis_async(_result_to_save(), get_analysis_uid())
+
+def get_draft_key():
+    """Draft key of this browser tab, kept in the URL so it survives a refresh"""
+    if 'draft_key' not in st.session_state:
+        st.session_state.draft_key = st.query_params.get(DRAFT_QUERY_PARAM) or uuid.uuid4().hex
+    if st.query_params.get(DRAFT_QUERY_PARAM) != st.session_state.draft_key:
+        st.query_params[DRAFT_QUERY_PARAM] = st.session_state.draft_key
+    return st.session_state.draft_key
+
+def draft_from_state(state, draft_key):
+    """
+    Plain draft dict (labels and matrices only) from a session-state mapping.
+    Takes the mapping explicitly so it also works outside the session's script run.
+    """
+    criteria_matrix = state['criteria_matrix'] if 'criteria_matrix' in state else None
+    alternative_matrices = state['alternative_matrices'] if 'alternative_matrices' in state else {}
+    return {
+        'draft_key': draft_key,
+        'name': state['current_session_name'],
+        'description': state['current_session_description'],
+        'criteria': list(state['criteria']),
+        'alternatives': list(state['alternatives']),
+        'criteria_matrix': np.array(criteria_matrix, dtype=np.float64) if criteria_matrix is not None else None,
+        'alternative_matrices': {k: np.array(v, dtype=np.float64) for k, v in alternative_matrices.items()},
+        'extra': {
+            'analysis_uid': state['analysis_uid'] if 'analysis_uid' in state else None,
+            # Nhật ký hoàn tác/làm lại đi cùng ma trận mà nó mô tả
+            'edit_log': edit_log_to_draft(state),
+        },
+    }
+
+def current_draft():
+    """Plain draft dict of the in-progress analysis (labels and matrices only)"""
+    return draft_from_state(st.session_state, get_draft_key())
+
+def _draft_fingerprint(draft):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((draft['name'], draft['description'], draft['criteria'], draft['alternatives'])).encode())
+    if draft['criteria_matrix'] is not None:
+        digest.update(draft['criteria_matrix'].tobytes())
+    for key in draft['criteria']:
+        if key in draft['alternative_matrices']:
+            digest.update(draft['alternative_matrices'][key].tobytes())
+    return digest.hexdigest()
+
+def autosave_draft():
+    """
+    Queue a debounced draft write if the labels or matrices changed since the
+    last autosave; reruns without changes cost one hash and no write
+    """
+    if not st.session_state.criteria and not st.session_state.alternatives:
+        return
+    draft = current_draft()
+    fingerprint = _draft_fingerprint(draft)
+    if st.session_state.get('draft_fingerprint') == fingerprint:
+        return
+    st.session_state.draft_fingerprint = fingerprint
+    save_draft_async(draft)
+
+def restore_draft():
+    """
+    Restore the draft named in the URL into a fresh browser session.
+    
+    Returns:
+        bool: True if a draft was restored
+    """
+    if st.session_state.get('draft_checked'):
+        return False
+    st.session_state.draft_checked = True
+    draft_key = st.query_params.get(DRAFT_QUERY_PARAM)
+    if not draft_key or st.session_state.criteria:
+        return False
+    draft = load_draft(draft_key)
+    if draft is None:
+        return False
+    
+    apply_draft(draft)
+    if st.session_state.criteria_matrix is not None:
+        st.session_state.current_tab = "input_matrices"
+    return True
+
+def apply_draft(draft):
+    """Load a draft's labels and matrices into session state"""
+    st.session_state.draft_key = draft['draft_key']
+    st.session_state.current_session_name = draft['name']
+    st.session_state.current_session_description = draft['description']
+    st.session_state.criteria = draft['criteria']
+    st.session_state.alternatives = draft['alternatives']
+    st.session_state.criteria_matrix = draft['criteria_matrix']
+    st.session_state.alternative_matrices = draft['alternative_matrices']
+    # Draft matrices were saved together with these labels
+    set_matrix_labels(draft['criteria'], draft['alternatives'])
+    edit_log_from_draft(draft['extra'].get('edit_log'))
+    if draft['extra'].get('analysis_uid'):
+        st.session_state.analysis_uid = draft['extra']['analysis_uid']
+    st.session_state.draft_fingerprint = _draft_fingerprint(draft)
+
+def discard_draft():
+    """Forget this tab's draft, both pending writes and the stored row"""
+    draft_key = st.session_state.get('draft_key') or st.query_params.get(DRAFT_QUERY_PARAM)
+    if draft_key:
+        cancel_draft(draft_key)
+        delete_draft(draft_key)
+    if DRAFT_QUERY_PARAM in st.query_params:
+        del st.query_params[DRAFT_QUERY_PARAM]
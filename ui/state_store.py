@@ -0,0 +1,148 @@
+import time
+import logging
+import threading
+import numpy as np
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from db import transaction, upsert_draft, load_draft
+from db_writer import cancel_draft
+from ui.state_adapter import draft_from_state, apply_draft
+
+# Phiên không tương tác quá IDLE_EVICT_SECONDS sẽ được chuyển ma trận xuống bản nháp
+IDLE_EVICT_SECONDS = 15 * 60
+SWEEP_INTERVAL_SECONDS = 60
+
+# Dữ liệu nặng của một phiên: ma trận và các giá trị suy ra được từ chúng
+HEAVY_KEYS = ('criteria_matrix', 'alternative_matrices', 'matrix_metrics', 'edit_log')
+# Trạng thái widget của bộ so sánh cặp được đồng bộ lại từ ma trận nên có thể bỏ
+HEAVY_PREFIXES = ('pw_',)
+
+_registry = {}
+_registry_lock = threading.Lock()
+# Khóa riêng của từng phiên: việc chuyển ma trận xuống bản nháp và lượt chạy
+# mới của chính phiên đó không được xen kẽ nhau
+_session_locks = {}
+_sweeper = None
+_stats = {'evicted': 0, 'reloaded': 0, 'evicted_bytes': 0}
+
+def state_footprint(state):
+    """Approximate bytes held by numpy arrays in a session's SafeSessionState"""
+    def nbytes(value):
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        if isinstance(value, dict):
+            return sum(nbytes(v) for v in value.values())
+        return 0
+    return sum(nbytes(value) for value in state.filtered_state.values())
+
+def _session_lock(session_id):
+    with _registry_lock:
+        return _session_locks.setdefault(session_id, threading.Lock())
+
+def touch_session():
+    """
+    Mark the current browser session as active and make sure the sweeper runs.
+
+    Waits for an eviction of this session that is in progress, so that
+    reload_evicted_state afterwards sees either the whole eviction or none of it.
+    """
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    with _session_lock(ctx.session_id):
+        with _registry_lock:
+            _registry[ctx.session_id] = (ctx.session_state, time.monotonic())
+    _ensure_sweeper()
+
+def _ensure_sweeper():
+    global _sweeper
+    with _registry_lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = threading.Thread(target=_sweep_loop, name="ahp-state-sweeper", daemon=True)
+            _sweeper.start()
+
+def _sweep_loop():
+    while True:
+        time.sleep(SWEEP_INTERVAL_SECONDS)
+        sweep_idle_sessions()
+
+def sweep_idle_sessions(idle_seconds=IDLE_EVICT_SECONDS):
+    """Evict every session idle for longer than idle_seconds; returns how many were evicted"""
+    now = time.monotonic()
+    with _registry_lock:
+        idle = [(session_id, state) for session_id, (state, last_active) in _registry.items()
+                if now - last_active >= idle_seconds]
+        for session_id, _ in idle:
+            del _registry[session_id]
+
+    evicted = 0
+    for session_id, state in idle:
+        try:
+            evicted += evict_session(session_id, state)
+        except Exception as e:
+            logging.error(f"Evicting idle session {session_id} failed: {e}")
+    return evicted
+
+def evict_session(session_id, state):
+    """
+    Write a session's matrices to its draft and drop them from memory.
+    They are reloaded by reload_evicted_state on the session's next rerun.
+
+    Runs under the session's lock and gives up if the session was touched
+    after the sweeper picked it, so a returning user never sees half-evicted state.
+
+    Returns:
+        bool: True if anything was evicted
+    """
+    with _session_lock(session_id):
+        with _registry_lock:
+            if session_id in _registry:
+                # The user came back after the sweep picked this session
+                return False
+        try:
+            if 'criteria_matrix' not in state or state['criteria_matrix'] is None or 'draft_key' not in state:
+                return False
+
+            draft_key = state['draft_key']
+            footprint = state_footprint(state)
+            # A pending debounced write holds older data; the synchronous write replaces it
+            cancel_draft(draft_key)
+            with transaction() as conn:
+                upsert_draft(conn, draft_from_state(state, draft_key))
+
+            state['evicted'] = True
+            for key in list(state.filtered_state):
+                if key in HEAVY_KEYS or key.startswith(HEAVY_PREFIXES):
+                    del state[key]
+            _stats['evicted'] += 1
+            _stats['evicted_bytes'] += footprint - state_footprint(state)
+            return True
+        finally:
+            with _registry_lock:
+                # touch_session tạo lại khóa khi phiên quay lại
+                if session_id not in _registry:
+                    _session_locks.pop(session_id, None)
+
+def reload_evicted_state():
+    """
+    Reload matrices spilled to the draft store while this session was idle.
+
+    Returns:
+        bool: True if the session had been evicted and was reloaded
+    """
+    if not st.session_state.get('evicted'):
+        return False
+    # Giữ cờ nếu đọc lỗi, để lượt chạy sau thử lại thay vì ghi đè bản nháp bằng ma trận rỗng
+    draft = load_draft(st.session_state.draft_key)
+    del st.session_state['evicted']
+    if draft is None:
+        logging.warning(f"Draft {st.session_state.draft_key} of an evicted session is missing")
+        return False
+    apply_draft(draft)
+    _stats['reloaded'] += 1
+    return True
+
+def get_state_store_stats():
+    """Eviction counters and the number of tracked sessions"""
+    with _registry_lock:
+        return dict(_stats, tracked_sessions=len(_registry))
@@ -0,0 +1,173 @@
+import logging
+import numpy as np
+import streamlit as st
+from ahp import remap_matrix
+from ui.matrix_metrics import CRITERIA_KEY
+
+# Nhãn mà các ma trận hiện tại được xây dựng theo; so với danh sách hiện tại để biết cấu trúc đã đổi gì
+MATRIX_LABELS_KEY = 'matrix_labels'
+# Các cặp so sánh mới (có nhãn vừa thêm) chưa được đánh giá, theo tên ma trận
+PENDING_PAIRS_KEY = 'pending_pairs'
+# Trạng thái bảng nhập tay lưu các ô đã sửa theo vị trí, không còn đúng khi ma trận đổi từ nơi khác
+EDITOR_KEY_PREFIXES = ('criteria_matrix_editor', 'alt_matrix_editor_')
+# Trạng thái widget theo nhãn cũ cũng sai khi hàng/cột thay đổi;
+# bộ so sánh cặp tự đồng bộ lại từ ma trận nên xóa đi là an toàn
+WIDGET_KEY_PREFIXES = EDITOR_KEY_PREFIXES + ('pw_',)
+
+def set_matrix_labels(criteria=None, alternatives=None):
+    """Record the labels the current matrices were built for (defaults to the current lists)"""
+    st.session_state[MATRIX_LABELS_KEY] = {
+        'criteria': list(st.session_state.criteria if criteria is None else criteria),
+        'alternatives': list(st.session_state.alternatives if alternatives is None else alternatives),
+    }
+
+def _matrix_labels():
+    """Labels of the current matrices; assumed to be the current lists when they were never recorded"""
+    labels = st.session_state.get(MATRIX_LABELS_KEY)
+    if labels is None:
+        set_matrix_labels()
+        labels = st.session_state[MATRIX_LABELS_KEY]
+    return labels
+
+def clear_editor_state():
+    """Drop manual-entry data editor state so the editors re-render from the matrices"""
+    for key in list(st.session_state.keys()):
+        if key.startswith(EDITOR_KEY_PREFIXES):
+            del st.session_state[key]
+
+def _clear_widget_state():
+    """Drop matrix editor and pairwise widget state built for the old structure"""
+    for key in list(st.session_state.keys()):
+        if key.startswith(WIDGET_KEY_PREFIXES):
+            del st.session_state[key]
+
+def _add_pending(name, labels, new_labels):
+    """Mark every pair of labels involving a label in new_labels as unanswered"""
+    pending = st.session_state.setdefault(PENDING_PAIRS_KEY, {}).setdefault(name, set())
+    for i, label_i in enumerate(labels):
+        for label_j in labels[i + 1:]:
+            if label_i in new_labels or label_j in new_labels:
+                pending.add((label_i, label_j))
+
+def _prune_pending(name, labels):
+    """Forget pending pairs whose labels were removed or reordered"""
+    pending = st.session_state.get(PENDING_PAIRS_KEY, {}).get(name)
+    if pending:
+        position = {label: k for k, label in enumerate(labels)}
+        pending.intersection_update(
+            {(a, b) for a, b in pending if a in position and b in position and position[a] < position[b]}
+        )
+
+def sync_matrix_structure():
+    """
+    Bring the matrices in line with the current criteria and alternatives.
+
+    Judgments between labels that still exist are kept; rows and columns of
+    added labels start at 1 and their pairs are marked pending; removed labels
+    are dropped. Alternative matrices of unchanged criteria are left untouched,
+    so their cached metrics stay valid.
+
+    Returns:
+        dict with added/removed criteria and alternatives, or None when the
+        matrices already match (or don't exist yet)
+    """
+    if st.session_state.get('criteria_matrix') is None:
+        return None
+    old = _matrix_labels()
+    criteria = list(st.session_state.criteria)
+    alternatives = list(st.session_state.alternatives)
+    if old['criteria'] == criteria and old['alternatives'] == alternatives:
+        return None
+
+    changes = {
+        'added_criteria': [c for c in criteria if c not in old['criteria']],
+        'removed_criteria': [c for c in old['criteria'] if c not in criteria],
+        'added_alternatives': [a for a in alternatives if a not in old['alternatives']],
+        'removed_alternatives': [a for a in old['alternatives'] if a not in alternatives],
+    }
+    metrics = st.session_state.get('matrix_metrics', {})
+
+    if old['criteria'] != criteria:
+        st.session_state.criteria_matrix = remap_matrix(st.session_state.criteria_matrix, old['criteria'], criteria)
+        _prune_pending(CRITERIA_KEY, criteria)
+        _add_pending(CRITERIA_KEY, criteria, set(changes['added_criteria']))
+
+    matrices = st.session_state.alternative_matrices
+    for criterion in changes['removed_criteria']:
+        matrices.pop(criterion, None)
+        metrics.pop(criterion, None)
+        st.session_state.get(PENDING_PAIRS_KEY, {}).pop(criterion, None)
+    alternatives_changed = old['alternatives'] != alternatives
+    for criterion in criteria:
+        if criterion not in matrices:
+            matrices[criterion] = np.ones((len(alternatives), len(alternatives)))
+            _add_pending(criterion, alternatives, set(alternatives))
+        elif alternatives_changed:
+            matrices[criterion] = remap_matrix(matrices[criterion], old['alternatives'], alternatives)
+            _prune_pending(criterion, alternatives)
+            _add_pending(criterion, alternatives, set(changes['added_alternatives']))
+
+    set_matrix_labels(criteria, alternatives)
+    _clear_widget_state()
+    logging.info(f"Matrix structure synced: {changes}")
+    return changes
+
+def rename_label(kind, old_name, new_name):
+    """
+    Carry a renamed criterion or alternative over to the matrices, so the
+    rename isn't seen as a removal plus an addition
+
+    Args:
+        kind: 'criteria' or 'alternatives'
+    """
+    if st.session_state.get('criteria_matrix') is None:
+        return
+    labels = _matrix_labels()[kind]
+    if old_name not in labels:
+        return
+    labels[labels.index(old_name)] = new_name
+
+    def rename_pair(pair):
+        return tuple(new_name if label == old_name else label for label in pair)
+
+    pending = st.session_state.get(PENDING_PAIRS_KEY, {})
+    if kind == 'criteria':
+        matrices = st.session_state.alternative_matrices
+        if old_name in matrices:
+            matrices[new_name] = matrices.pop(old_name)
+        metrics = st.session_state.get('matrix_metrics', {})
+        if old_name in metrics:
+            metrics[new_name] = metrics.pop(old_name)
+        if old_name in pending:
+            pending[new_name] = pending.pop(old_name)
+        if CRITERIA_KEY in pending:
+            pending[CRITERIA_KEY] = {rename_pair(pair) for pair in pending[CRITERIA_KEY]}
+    else:
+        for name in pending:
+            if name != CRITERIA_KEY:
+                pending[name] = {rename_pair(pair) for pair in pending[name]}
+    _clear_widget_state()
+
+def get_pending_pairs(name):
+    """Unanswered (label_i, label_j) pairs of a matrix, label_i before label_j"""
+    return st.session_state.get(PENDING_PAIRS_KEY, {}).get(name, set())
+
+def mark_pair_answered(name, label_i, label_j):
+    st.session_state.get(PENDING_PAIRS_KEY, {}).get(name, set()).discard((label_i, label_j))
+
+def mark_changed_answered(name, labels, before, after):
+    """Mark pending pairs whose value differs between two versions of a matrix as answered"""
+    pending = get_pending_pairs(name)
+    if not pending:
+        return
+    position = {label: k for k, label in enumerate(labels)}
+    pending.difference_update(
+        {(a, b) for a, b in pending if before[position[a], position[b]] != after[position[a], position[b]]}
+    )
+
+def clear_pending(name=None):
+    """Forget pending pairs of one matrix, or of all matrices"""
+    if name is None:
+        st.session_state.pop(PENDING_PAIRS_KEY, None)
+    else:
+        st.session_state.get(PENDING_PAIRS_KEY, {}).pop(name, None)
@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from utils.i18n import get_text
-from db import get_past_sessions, get_session_data
+from utils.i18n import get_text, get_language
+from db import get_sessions_page, load_session, get_revisions, load_revision
 from utils.formatting import format_decimal, format_percentage
 import io
 import base64
@@ -11,6 +11,13 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from utils.export_utils import export_to_excel, export_to_pdf
+from ui.state_adapter import current_result
+from ui.matrix_metrics import stale_matrices
+from ui.compare_results import show_compare_results
+from ui.job_status import register_delivery, run_job, is_running
+
+# Số phân tích hiển thị trên mỗi trang kết quả trước đây
+PAST_SESSIONS_PAGE_SIZE = 20
 
 def show_view_results():
     """Show the view results UI"""
@@ -19,18 +26,74 @@ def show_view_results():
     # Option to view current results or past results
     view_option = st.radio(
         "Select view option:",
-        [get_text("current_results"), get_text("past_results")],
+        [get_text("current_results"), get_text("past_results"), get_text("compare_results")],
         horizontal=True
     )
     
     if view_option == get_text("current_results"):
         show_current_results()
-    else:  # Past Results
+    elif view_option == get_text("past_results"):
         show_past_results()
+    else:
+        show_compare_results()
+
+def _combine_reports(results):
+    return {'excel': results[0], 'pdf': results[1]}
+
+@register_delivery('report')
+def deliver_reports(files, context):
+    """Keep rendered export files in session state until their results change"""
+    st.session_state[context['target']] = dict(files, version=context['version'])
+
+def show_export_section(name, version, get_result, file_stem):
+    """
+    Prepare button, progress note or download buttons for one result's exports.
+
+    Args:
+        name: unique name of the export (slot and session-state key)
+        version: changes whenever the exported result changes
+        get_result: returns the plain result mapping, called only when rendering starts
+        file_stem: download file name without extension
+    """
+    target = f"exports_{name}"
+    slot = f"report_{name}"
+    files = st.session_state.get(target)
+    if files is not None and files['version'] == version:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                label=get_text("export_excel"),
+                data=files['excel'],
+                file_name=f"{file_stem}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
+        with col2:
+            st.download_button(
+                label=get_text("export_pdf"),
+                data=files['pdf'],
+                file_name=f"{file_stem}.pdf",
+                mime="application/pdf",
+            )
+    elif is_running(slot):
+        st.info("⏳ Đang tạo file xuất...")
+    elif st.button("📦 Chuẩn bị file xuất", key=f"prepare_export_{name}"):
+        result = get_result()
+        language = get_language()
+        # Small reports render inline; large ones go to the worker pool (see run_job)
+        if run_job(slot, 'report', [
+            (export_to_excel, (result, language)),
+            (export_to_pdf, (result, None, None, language)),
+        ], {'target': target, 'version': version}, combine=_combine_reports,
+                units=len(result['criteria']) * len(result['alternatives'])):
+            st.rerun()
 
 def show_current_results():
     """Show current results"""
     if st.session_state.final_scores is not None:
+        stale = stale_matrices()
+        if stale:
+            st.warning(f"⚠️ Kết quả chưa được tính lại sau khi thay đổi {len(stale)} ma trận.")
+        
         # Create a 3-column layout for better organization
         col1, col2 = st.columns(2)
         
@@ -147,33 +210,144 @@ def show_current_results():
         st.markdown("---")
         st.subheader(get_text("export_results"))
         
-        col1, col2 = st.columns(2)
-        with col1:
-            # Export to Excel
-            excel_data = export_to_excel(None, is_current=True, st=st)
-            st.download_button(
-                label=get_text("export_excel"),
-                data=excel_data,
-                file_name="ahp_results.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
-        
-        with col2:
-            # Export to PDF
-            pdf_data = export_to_pdf(None, is_current=True, st=st)
-            st.download_button(
-                label=get_text("export_pdf"),
-                data=pdf_data,
-                file_name="ahp_results.pdf",
-                mime="application/pdf",
-            )
+        # Exports are rendered on request (large ones in the worker pool) and kept until the results change
+        export_version = repr(sorted(st.session_state.get('results_fingerprints', {}).items()))
+        show_export_section('current', export_version, current_result, "ahp_results")
     else:
         st.info(get_text("no_results"))
 
+# Số phân tích trước đây có bảng đã dựng được giữ trong bộ nhớ đệm
+PAST_RENDER_CACHE_ENTRIES = 64
+
+def past_row_version(session_data):
+    """
+    Changes whenever a stored session row changes: every save, including a
+    duplicate re-save that only updates name, description and timestamp,
+    writes a new timestamp, and a revision also changes the content hash
+    """
+    return f"{session_data['content_hash']}@{session_data['timestamp']}"
+
+@st.cache_data(max_entries=PAST_RENDER_CACHE_ENTRIES, show_spinner=False)
+def past_summary_frames(session_id, row_version, language):
+    """
+    Summary tables and chart data of a past analysis.
+    
+    Cached per row version (see past_row_version), so a revised or re-saved
+    session is rebuilt while flipping between unchanged sessions reuses the
+    built frames.
+    """
+    session_data = load_session(session_id)
+    criteria = session_data['criteria']
+    alternatives = session_data['alternatives']
+    ratios = session_data['consistency_ratios']
+    has_metrics = 'lambda_max_values' in session_data and 'consistency_indices' in session_data
+    
+    criteria_weights = np.asarray(session_data['criteria_weights'])
+    order = np.argsort(-criteria_weights, kind='stable')
+    criteria_weights_df = pd.DataFrame({
+        get_text("criterion", language): [criteria[i] for i in order],
+        get_text("weight", language): [format_decimal(criteria_weights[i]) for i in order]
+    })
+    
+    if has_metrics:
+        lambda_max_values = session_data['lambda_max_values']
+        consistency_indices = session_data['consistency_indices']
+        criteria_consistency = [
+            f"λ_max: {format_decimal(lambda_max_values['criteria'])}",
+            f"CI: {format_decimal(consistency_indices['criteria'])}",
+            f"CR: {format_decimal(ratios['criteria'])}",
+        ]
+        consistency_df = pd.DataFrame({
+            get_text("criterion", language): criteria,
+            "λ_max": [format_decimal(lambda_max_values[c]) for c in criteria],
+            "CI": [format_decimal(consistency_indices[c]) for c in criteria],
+            "CR": [format_decimal(ratios[c]) for c in criteria],
+        })
+    else:
+        criteria_consistency = [f"CR: {format_decimal(ratios['criteria'])}"]
+        consistency_df = pd.DataFrame({
+            get_text("criterion", language): criteria,
+            get_text("consistency_ratio_for", language): [format_decimal(ratios[c]) for c in criteria],
+        })
+    
+    final_scores = np.asarray(session_data['final_scores'])
+    order = np.argsort(-final_scores, kind='stable')
+    final_scores_df = pd.DataFrame({
+        get_text("alternative", language): [alternatives[i] for i in order],
+        get_text("score", language): [format_percentage(final_scores[i]) for i in order],
+        get_text("rank", language): range(1, len(order) + 1),
+    })
+    chart = pd.Series(final_scores[order], index=[alternatives[i] for i in order], name='Score')
+    
+    return {
+        'criteria_weights': criteria_weights_df,
+        'criteria_consistency': criteria_consistency,
+        'consistency': consistency_df,
+        'final_scores': final_scores_df,
+        'chart': chart,
+    }
+
+@st.cache_data(max_entries=PAST_RENDER_CACHE_ENTRIES, show_spinner=False)
+def past_detail_frames(session_id, row_version, language):
+    """
+    Per-criterion alternative weight tables of a past analysis
+    
+    Returns:
+        list of (criterion, weights DataFrame, consistency lines or [])
+    """
+    session_data = load_session(session_id)
+    alternatives = session_data['alternatives']
+    alternative_weights = session_data['alternative_weights']
+    lambda_max_values = session_data.get('lambda_max_values') or {}
+    consistency_indices = session_data.get('consistency_indices') or {}
+    ratios = session_data['consistency_ratios']
+    
+    details = []
+    for criterion in session_data['criteria']:
+        weights = np.asarray(alternative_weights[criterion])
+        order = np.argsort(-weights, kind='stable')
+        alt_weights_df = pd.DataFrame({
+            get_text("alternative", language): [alternatives[i] for i in order],
+            get_text("weight", language): [format_decimal(weights[i]) for i in order]
+        })
+        consistency_lines = []
+        if criterion in lambda_max_values and criterion in consistency_indices and criterion in ratios:
+            consistency_lines = [
+                f"λ_max: {format_decimal(lambda_max_values[criterion])}",
+                f"CI: {format_decimal(consistency_indices[criterion])}",
+                f"CR: {format_decimal(ratios[criterion])}",
+            ]
+        details.append((criterion, alt_weights_df, consistency_lines))
+    return details
+
 def show_past_results():
     """Show past results"""
-    # Fetch past sessions from database
-    past_sessions = get_past_sessions()
+    # Search box and keyset pagination: only the visible page is fetched
+    search = st.text_input("🔍 Tìm kiếm theo tên hoặc mô tả", key="past_search")
+    if st.session_state.get('past_search_applied') != search:
+        st.session_state.past_search_applied = search
+        st.session_state.past_page_cursors = [None]
+    if 'past_page_cursors' not in st.session_state:
+        st.session_state.past_page_cursors = [None]
+    
+    page_cursors = st.session_state.past_page_cursors
+    past_sessions, next_cursor = get_sessions_page(
+        limit=PAST_SESSIONS_PAGE_SIZE,
+        after=page_cursors[-1],
+        search=search
+    )
+    
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("◀ Trang trước", disabled=len(page_cursors) == 1, key="past_prev_page"):
+            page_cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Trang {len(page_cursors)}")
+    with col_next:
+        if st.button("Trang sau ▶", disabled=next_cursor is None, key="past_next_page"):
+            page_cursors.append(next_cursor)
+            st.rerun()
     
     if past_sessions:
         session_options = [f"{session[1]} ({session[2]})" for session in past_sessions]
@@ -186,8 +360,8 @@ def show_past_results():
         )
         selected_session_id = session_ids[selected_session_idx]
         
-        # Fetch selected session data
-        session_data = get_session_data(selected_session_id)
+        # Lazy handle: summary now, matrices and detailed weights on access
+        session_data = load_session(selected_session_id)
         
         if session_data:
             # Display session info
@@ -195,152 +369,96 @@ def show_past_results():
             st.write(f"{get_text('description')}: {session_data['description']}")
             st.write(f"{get_text('date')}: {session_data['timestamp']}")
             
+            # Tables and chart data are cached per (session id, row version, language)
+            language = get_language()
+            row_version = past_row_version(session_data)
+            frames = past_summary_frames(session_data['id'], row_version, language)
+            
             # Create a 3-column layout for better organization
             col1, col2 = st.columns(2)
             
             # Column 1: Criteria Weights and Consistency Ratios
             with col1:
-                # Display criteria weights - Use decimal format instead of percentage
                 st.subheader(get_text("criteria_weights"))
-                criteria_weights_df = pd.DataFrame({
-                    get_text("criterion"): session_data['criteria'],
-                    get_text("weight"): [format_decimal(w) for w in session_data['criteria_weights']]
-                })
-                criteria_weights_df = criteria_weights_df.sort_values(get_text("weight"), ascending=False)
-                
-                # Apply styling to the dataframe
-                st.dataframe(
-                    criteria_weights_df,
-                    use_container_width=True,
-                    hide_index=True
-                )
+                st.dataframe(frames['criteria_weights'], use_container_width=True, hide_index=True)
                 
                 # Display consistency metrics
                 st.subheader(get_text("consistency_metrics"))
-                if 'lambda_max_values' in session_data and 'consistency_indices' in session_data:
-                    st.write(f"λ_max: {format_decimal(session_data['lambda_max_values']['criteria'])}")
-                    st.write(f"CI: {format_decimal(session_data['consistency_indices']['criteria'])}")
-                    st.write(f"CR: {format_decimal(session_data['consistency_ratios']['criteria'])}")
-                else:
-                    st.write(f"CR: {format_decimal(session_data['consistency_ratios']['criteria'])}")
+                for line in frames['criteria_consistency']:
+                    st.write(line)
                 st.write(get_text("consistency_acceptable"))
-                
-                # Create a dataframe for consistency metrics
-                cr_data = {
-                    get_text("criterion"): [],
-                }
-                
-                if 'lambda_max_values' in session_data and 'consistency_indices' in session_data:
-                    cr_data["λ_max"] = []
-                    cr_data["CI"] = []
-                    cr_data["CR"] = []
-                else:
-                    cr_data[get_text("consistency_ratio_for")] = []
-                
-                for criterion in session_data['criteria']:
-                    cr_data[get_text("criterion")].append(criterion)
-                    if 'lambda_max_values' in session_data and 'consistency_indices' in session_data:
-                        cr_data["λ_max"].append(format_decimal(session_data['lambda_max_values'][criterion]))
-                        cr_data["CI"].append(format_decimal(session_data['consistency_indices'][criterion]))
-                        cr_data["CR"].append(format_decimal(session_data['consistency_ratios'][criterion]))
-                    else:
-                        cr_data[get_text("consistency_ratio_for")].append(format_decimal(session_data['consistency_ratios'][criterion]))
-                
-                cr_df = pd.DataFrame(cr_data)
-                st.dataframe(
-                    cr_df,
-                    use_container_width=True,
-                    hide_index=True
-                )
+                st.dataframe(frames['consistency'], use_container_width=True, hide_index=True)
             
-            # Column 2: Alternative Weights by Criterion
+            # Column 2: Alternative Weights by Criterion (decoded only when requested)
             with col2:
                 st.subheader(get_text("alternative_weights_by_criterion"))
+                show_details = st.checkbox("Hiển thị chi tiết theo tiêu chí", key=f"past_details_{session_data['id']}")
                 
-                # Create tabs for each criterion
-                criterion_tabs = st.tabs(session_data['criteria'])
-                
-                for i, criterion in enumerate(session_data['criteria']):
-                    with criterion_tabs[i]:
-                        # Use decimal format instead of percentage for alternative weights
-                        alt_weights_df = pd.DataFrame({
-                            get_text("alternative"): session_data['alternatives'],
-                            get_text("weight"): [format_decimal(w) for w in session_data['alternative_weights'][criterion]]
-                        })
-                        alt_weights_df = alt_weights_df.sort_values(get_text("weight"), ascending=False)
-                        
-                        # Apply styling to the dataframe
-                        st.dataframe(
-                            alt_weights_df,
-                            use_container_width=True,
-                            hide_index=True
-                        )
-                        # Hiển thị chỉ số nhất quán của bảng phương án theo tiêu chí nếu có
-                        if (
-                            'lambda_max_values' in session_data and
-                            'consistency_indices' in session_data and
-                            'consistency_ratios' in session_data and
-                            criterion in session_data['lambda_max_values'] and
-                            criterion in session_data['consistency_indices'] and
-                            criterion in session_data['consistency_ratios']
-                        ):
-                            st.markdown(f"**Chỉ số nhất quán cho bảng phương án theo tiêu chí '{criterion}':**")
-                            st.write(f"λ_max: {format_decimal(session_data['lambda_max_values'][criterion])}")
-                            st.write(f"CI: {format_decimal(session_data['consistency_indices'][criterion])}")
-                            st.write(f"CR: {format_decimal(session_data['consistency_ratios'][criterion])}")
+                if show_details:
+                    details = past_detail_frames(session_data['id'], row_version, language)
+                    criterion_tabs = st.tabs([criterion for criterion, _, _ in details])
+                    for tab, (criterion, alt_weights_df, consistency_lines) in zip(criterion_tabs, details):
+                        with tab:
+                            st.dataframe(alt_weights_df, use_container_width=True, hide_index=True)
+                            # Hiển thị chỉ số nhất quán của bảng phương án theo tiêu chí nếu có
+                            if consistency_lines:
+                                st.markdown(f"**Chỉ số nhất quán cho bảng phương án theo tiêu chí '{criterion}':**")
+                                for line in consistency_lines:
+                                    st.write(line)
             
             # Final Scores and Ranking (full width) - Keep percentage format
             st.markdown("---")
             st.subheader(get_text("final_scores"))
-            final_scores_df = pd.DataFrame({
-                get_text("alternative"): session_data['alternatives'],
-                get_text("score"): [format_percentage(s) for s in session_data['final_scores']]
-            })
-            final_scores_df = final_scores_df.sort_values(get_text("score"), ascending=False)
-            final_scores_df[get_text("rank")] = range(1, len(final_scores_df) + 1)
-            
-            # Apply styling to the dataframe
-            st.dataframe(
-                final_scores_df,
-                use_container_width=True,
-                hide_index=True
-            )
+            st.dataframe(frames['final_scores'], use_container_width=True, hide_index=True)
             
             # Visualization
             st.subheader(get_text("visualization"))
+            st.bar_chart(frames['chart'])
             
-            # Convert percentage strings back to floats for the chart
-            chart_data = pd.DataFrame({
-                'Alternative': session_data['alternatives'],
-                'Score': session_data['final_scores']
-            })
-            chart_data = chart_data.sort_values('Score', ascending=False)
-            
-            st.bar_chart(chart_data.set_index('Alternative')['Score'])
+            # Lịch sử chỉnh sửa: chỉ đọc danh sách phiên bản, ma trận và kết quả được dựng lại khi chọn
+            revisions = get_revisions(session_data['id'])
+            if len(revisions) > 1:
+                with st.expander("🕘 Lịch sử chỉnh sửa"):
+                    revision_df = pd.DataFrame(revisions, columns=["Phiên bản", "Loại", "Số ô thay đổi", get_text("date")])
+                    st.dataframe(revision_df, use_container_width=True, hide_index=True)
+                    
+                    revision_numbers = [r[0] for r in revisions]
+                    selected_revision = st.selectbox(
+                        "Xem ma trận và kết quả của phiên bản",
+                        revision_numbers,
+                        index=len(revision_numbers) - 1,
+                        key=f"past_revision_{session_data['id']}"
+                    )
+                    revision_data = load_revision(session_data['id'], selected_revision)
+                    if revision_data:
+                        st.markdown(f"**{get_text('criteria_comparison')}** ({revision_data['timestamp']})")
+                        st.dataframe(pd.DataFrame(
+                            revision_data['criteria_matrix'],
+                            index=revision_data['criteria'],
+                            columns=revision_data['criteria']
+                        ).style.format("{:.3f}"), use_container_width=True)
+                        st.write(f"CR: {format_decimal(revision_data['consistency_ratios']['criteria'])}")
+                        
+                        revision_scores = np.asarray(revision_data['final_scores'])
+                        revision_order = np.argsort(-revision_scores, kind='stable')
+                        st.markdown(f"**{get_text('final_scores')}**")
+                        st.dataframe(pd.DataFrame({
+                            get_text("alternative"): [revision_data['alternatives'][i] for i in revision_order],
+                            get_text("score"): [format_percentage(revision_scores[i]) for i in revision_order],
+                            get_text("rank"): range(1, len(revision_order) + 1),
+                        }), use_container_width=True, hide_index=True)
             
             # Add export functionality
             st.markdown("---")
             st.subheader(get_text("export_results"))
             
-            col1, col2 = st.columns(2)
-            with col1:
-                # Export to Excel
-                excel_data = export_to_excel(session_data, is_current=False, st=st)
-                st.download_button(
-                    label=get_text("export_excel"),
-                    data=excel_data,
-                    file_name=f"ahp_results_{session_data['id']}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                )
-            with col2:
-                # Export to PDF
-                pdf_data = export_to_pdf(session_data, is_current=False, st=st)
-                st.download_button(
-                    label=get_text("export_pdf"),
-                    data=pdf_data,
-                    file_name=f"ahp_results_{session_data['id']}.pdf",
-                    mime="application/pdf",
-                )
+            # Exports need every matrix, so they are built only on request
+            show_export_section(
+                f"past_{session_data['id']}",
+                row_version,
+                lambda: {key: session_data.get(key) for key in session_data},
+                f"ahp_results_{session_data['id']}"
+            )
             # Nút xóa phân tích
             st.markdown("---")
             if st.button("🗑️ Xóa phân tích này", type="secondary"):
@@ -2,7 +2,7 @@ import os
 import io
 import pandas as pd
 from utils.formatting import format_decimal, format_percentage
-from utils.i18n import get_text
+from utils.i18n import get_text as translate
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib import colors
@@ -14,28 +14,36 @@ from reportlab.platypus import (
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 
-def export_to_excel(session_data, is_current=True, st=None):
+def _result_fields(result):
+    """Pull the fields shared by both exports out of a plain result mapping"""
+    return (
+        result['criteria'],
+        result['alternatives'],
+        result['criteria_weights'],
+        result['alternative_weights'],
+        result['final_scores'],
+        result['consistency_ratios'],
+        result.get('lambda_max_values', None),
+        result.get('consistency_indices', None),
+    )
+
+def export_to_excel(result, language=None):
+    """
+    Export results to Excel bytes
+    
+    Args:
+        result: Plain result mapping (dict or db.SessionHandle) with criteria,
+            alternatives, criteria_weights, alternative_weights, final_scores,
+            consistency_ratios and optionally lambda_max_values, consistency_indices
+        language: Language for labels; defaults to the current session language
+    """
+    def get_text(key):
+        return translate(key, language)
+    
     output = io.BytesIO()
     writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    # get_text đã import trực tiếp, không lấy từ session_state nữa
-    if is_current:
-        criteria = st.session_state.criteria
-        alternatives = st.session_state.alternatives
-        criteria_weights = st.session_state.criteria_weights
-        alternative_weights = st.session_state.alternative_weights
-        final_scores = st.session_state.final_scores
-        consistency_ratios = st.session_state.consistency_ratios
-        lambda_max_values = getattr(st.session_state, 'lambda_max_values', None)
-        consistency_indices = getattr(st.session_state, 'consistency_indices', None)
-    else:
-        criteria = session_data['criteria']
-        alternatives = session_data['alternatives']
-        criteria_weights = session_data['criteria_weights']
-        alternative_weights = session_data['alternative_weights']
-        final_scores = session_data['final_scores']
-        consistency_ratios = session_data['consistency_ratios']
-        lambda_max_values = session_data.get('lambda_max_values', None)
-        consistency_indices = session_data.get('consistency_indices', None)
+    (criteria, alternatives, criteria_weights, alternative_weights, final_scores,
+     consistency_ratios, lambda_max_values, consistency_indices) = _result_fields(result)
     # Create dataframe for criteria weights
     criteria_weights_df = pd.DataFrame({
         get_text("criterion"): criteria,
@@ -78,7 +86,16 @@ def export_to_excel(session_data, is_current=True, st=None):
     return output.getvalue()
 
 
-def export_to_pdf(session_data, is_current=True, st=None, criteria_matrix=None, alternative_matrices=None):
+def export_to_pdf(result, criteria_matrix=None, alternative_matrices=None, language=None):
+    """
+    Export results to PDF bytes
+    
+    Args:
+        result: Plain result mapping as for export_to_excel, plus name,
+            description, timestamp and the input matrices when available
+        criteria_matrix, alternative_matrices: Override the matrices in result
+        language: Language for labels; defaults to the current session language
+    """
     import matplotlib
     matplotlib.use('Agg')
     import matplotlib.pyplot as plt
@@ -87,48 +104,20 @@ def export_to_pdf(session_data, is_current=True, st=None, criteria_matrix=None,
     from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
     from reportlab.lib.pagesizes import A4
     
+    def get_text(key):
+        return translate(key, language)
+    
     buffer = io.BytesIO()
-    # get_text đã import trực tiếp, không lấy từ session_state nữa
-    if is_current:
-        criteria = st.session_state.criteria
-        alternatives = st.session_state.alternatives
-        criteria_weights = st.session_state.criteria_weights
-        alternative_weights = st.session_state.alternative_weights
-        final_scores = st.session_state.final_scores
-        consistency_ratios = st.session_state.consistency_ratios
-        lambda_max_values = getattr(st.session_state, 'lambda_max_values', None)
-        consistency_indices = getattr(st.session_state, 'consistency_indices', None)
-        report_title = getattr(st.session_state, 'current_session_name', "Kết quả AHP")
-        report_desc = getattr(st.session_state, 'current_session_description', "")
-        report_time = datetime.now().strftime('%d/%m/%Y %H:%M')
-        # Lấy ma trận đầu vào nếu chưa truyền vào
-        if criteria_matrix is None:
-            criteria_matrix = st.session_state.criteria_matrix
-        if alternative_matrices is None:
-            alternative_matrices = st.session_state.alternative_matrices
-    else:
-        criteria = session_data['criteria']
-        alternatives = session_data['alternatives']
-        criteria_weights = session_data['criteria_weights']
-        alternative_weights = session_data['alternative_weights']
-        final_scores = session_data['final_scores']
-        consistency_ratios = session_data['consistency_ratios']
-        lambda_max_values = session_data.get('lambda_max_values', None)
-        consistency_indices = session_data.get('consistency_indices', None)
-        report_title = session_data.get('name', "Kết quả AHP")
-        report_desc = session_data.get('description', "")
-        report_time = session_data.get('timestamp', datetime.now().strftime('%d/%m/%Y %H:%M'))
-        # Lấy ma trận đầu vào nếu có (ưu tiên dạng list để in ra PDF)
-        if criteria_matrix is None:
-            if 'criteria_matrix_list' in session_data:
-                criteria_matrix = session_data['criteria_matrix_list']
-            else:
-                criteria_matrix = session_data.get('criteria_matrix', None)
-        if alternative_matrices is None:
-            if 'alternative_matrices_list' in session_data:
-                alternative_matrices = session_data['alternative_matrices_list']
-            else:
-                alternative_matrices = session_data.get('alternative_matrices', None)
+    (criteria, alternatives, criteria_weights, alternative_weights, final_scores,
+     consistency_ratios, lambda_max_values, consistency_indices) = _result_fields(result)
+    report_title = result.get('name') or "Kết quả AHP"
+    report_desc = result.get('description') or ""
+    report_time = result.get('timestamp') or datetime.now().strftime('%d/%m/%Y %H:%M')
+    # Lấy ma trận đầu vào nếu chưa truyền vào
+    if criteria_matrix is None:
+        criteria_matrix = result.get('criteria_matrix', None)
+    if alternative_matrices is None:
+        alternative_matrices = result.get('alternative_matrices', None)
     # Font đẹp cho tiếng Việt (nếu có)
     font_name = 'Helvetica'
     bold_font_name = 'Helvetica-Bold'
@@ -1,4 +1,11 @@
-import streamlit as st
+try:
+    import streamlit as st
+except ImportError:
+    # Worker processes and batch jobs may run without streamlit
+    st = None
+
+# Ngôn ngữ mặc định khi không có session state (tiến trình nền, batch)
+DEFAULT_LANGUAGE = "vi"
 
 # Dictionary of translations
 translations = {
@@ -28,6 +35,7 @@ translations = {
         "create_new_analysis": "Create New Analysis",
         "input_matrices": "Input Matrices",
         "view_results": "View Results",
+        "analytics_dashboard": "Analytics",
         
         # Create Analysis
         "step_1": "Step 1: Define Problem",
@@ -82,6 +90,7 @@ translations = {
         # View Results
         "current_results": "Current Results",
         "past_results": "Past Results",
+        "compare_results": "Compare Analyses",
         "criteria_weights": "Criteria Weights",
         "consistency_ratios": "Consistency Ratios",
         "consistency_metrics": "Consistency Metrics",
@@ -134,6 +143,7 @@ translations = {
         "create_new_analysis": "Tạo Phân Tích Mới",
         "input_matrices": "Nhập Ma Trận",
         "view_results": "Xem Kết Quả",
+        "analytics_dashboard": "Thống Kê",
         
         # Create Analysis
         "step_1": "Bước 1: Xác Định Vấn Đề",
@@ -185,6 +195,7 @@ translations = {
         # View Results
         "current_results": "Kết Quả Hiện Tại",
         "past_results": "Kết Quả Trước Đây",
+        "compare_results": "So Sánh Phân Tích",
         "criteria_weights": "Trọng Số Tiêu Chí",
         "consistency_ratios": "Tỷ Số Nhất Quán",
         "consistency_metrics": "Các chỉ số nhất quán",
@@ -216,7 +227,16 @@ def set_language(language):
         language = "vi"
     st.session_state.language = language
 
-def get_text(key):
-    """Get translated text for the current language"""
-    language = st.session_state.language
+def get_language():
+    """Current session language, or DEFAULT_LANGUAGE outside a Streamlit session"""
+    if st is not None:
+        try:
+            return st.session_state.language
+        except Exception:
+            pass
+    return DEFAULT_LANGUAGE
+
+def get_text(key, language=None):
+    """Get translated text for the given or current language"""
+    language = language or get_language()
     return translations.get(language, translations["vi"]).get(key, key)
\ No newline at end of file
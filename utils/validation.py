@@ -1,5 +1,10 @@
 import streamlit as st
 from utils.i18n import get_text
+from ahp import CONSISTENCY_THRESHOLD
+
+# Giới hạn số tiêu chí và phương án của một phân tích
+MAX_CRITERIA = 50
+MAX_ALTERNATIVES = 15
 
 def validate_name(name, existing_names):
     """Validate a name (criterion or alternative)"""
@@ -20,7 +25,7 @@ def validate_analysis_setup():
 
 def validate_matrix_consistency(consistency_ratio):
     """Validate that a matrix has acceptable consistency ratio (CR < 0.1)"""
-    if consistency_ratio >= 0.1:
+    if consistency_ratio >= CONSISTENCY_THRESHOLD:
         return False, get_text("error_consistency_ratio")
     
     return True, ""
\ No newline at end of file